@@ -1,18 +1,58 @@
 from flask import Flask
 from dotenv import load_dotenv
+import atexit
 import os
+import sys
+
+# Le module d'instrumentation est partagé avec les scripts du pipeline
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
 
 # Charger les variables d'environnement
 load_dotenv()
 
 app = Flask(__name__)
 
+# Configuration des ressources partagées (connexions MySQL, MongoDB et S3)
+app.config.update(
+    MYSQL_HOST=os.getenv("MYSQL_HOST"),
+    MYSQL_USER=os.getenv("MYSQL_USER"),
+    MYSQL_PASSWORD=os.getenv("MYSQL_PASSWORD"),
+    MYSQL_DB=os.getenv("MYSQL_DB"),
+    MYSQL_POOL_SIZE=int(os.getenv("MYSQL_POOL_SIZE", 5)),
+    MYSQL_POOL_TIMEOUT=int(os.getenv("MYSQL_POOL_TIMEOUT", 10)),
+    MONGO_URI=os.getenv("MONGO_URI"),
+    MONGO_DB=os.getenv("MONGO_DB"),
+    MONGO_POOL_SIZE=int(os.getenv("MONGO_POOL_SIZE", 20)),
+    MONGO_TIMEOUT_MS=int(os.getenv("MONGO_TIMEOUT_MS", 5000)),
+    AWS_ACCESS_KEY_ID=os.getenv("AWS_ACCESS_KEY_ID"),
+    AWS_SECRET_ACCESS_KEY=os.getenv("AWS_SECRET_ACCESS_KEY"),
+    AWS_REGION=os.getenv("AWS_REGION", "eu-west-3"),
+    S3_BUCKET=os.getenv("S3_BUCKET"),
+    STATS_CACHE_TTL=int(os.getenv("STATS_CACHE_TTL", 30)),
+    HTTP_CACHE_MAX_AGE=int(os.getenv("HTTP_CACHE_MAX_AGE", 10)),
+    METRICS_DIR=os.getenv("METRICS_DIR", ""),
+    PROFILE_DIR=os.getenv("PROFILE_DIR", ""),
+)
+
+# Profilage optionnel : un fichier cProfile par requête dans PROFILE_DIR
+if app.config["PROFILE_DIR"]:
+    from werkzeug.middleware.profiler import ProfilerMiddleware
+    os.makedirs(app.config["PROFILE_DIR"], exist_ok=True)
+    app.wsgi_app = ProfilerMiddleware(app.wsgi_app, stream=None, profile_dir=app.config["PROFILE_DIR"])
+
+# Les ressources sont partagées par tous les blueprints et fermées à l'arrêt du processus
+from resources import resources
+resources.init_app(app)
+atexit.register(resources.close)
+
 # Importer les blueprints depuis les endpoints
 from endpoints.raw import raw_bp
 from endpoints.staging import staging_bp
 from endpoints.curated import curated_bp
 from endpoints.health import health_bp
 from endpoints.stats import stats_bp
+from endpoints.metrics import metrics_bp, init_app as init_metrics
+from http_cache import init_app as init_http_cache
 
 # Enregistrer les blueprints avec un préfixe d'URL
 app.register_blueprint(raw_bp, url_prefix="/raw")
@@ -20,6 +60,13 @@ app.register_blueprint(staging_bp, url_prefix="/staging")
 app.register_blueprint(curated_bp, url_prefix="/curated")
 app.register_blueprint(health_bp, url_prefix="/health")
 app.register_blueprint(stats_bp, url_prefix="/stats")
+app.register_blueprint(metrics_bp, url_prefix="/metrics")
+
+# Compteurs et latences de toutes les requêtes, exposés sur /metrics
+init_metrics(app)
+# ETag, Cache-Control et réponses 304 ; enregistré après les métriques pour s'exécuter avant elles
+# (les fonctions after_request sont appelées dans l'ordre inverse) et que les 304 y soient comptés
+init_http_cache(app)
 
 if __name__ == "__main__":
     port = int(os.getenv("API_PORT", 5000))
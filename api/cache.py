@@ -0,0 +1,30 @@
+import threading
+import time
+
+class TTLCache:
+    """Cache clé -> valeur en mémoire, thread-safe, dont les entrées expirent après ttl secondes."""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Retourne la valeur encore valide associée à key, ou None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
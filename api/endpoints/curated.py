@@ -1,23 +1,131 @@
-from flask import Blueprint, jsonify
-from pymongo import MongoClient
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from resources import resources
+from query_params import int_arg, float_arg, page_args, fields_arg
+from export import iter_batches, ndjson_chunks, csv_chunks, parquet_chunks, gzip_chunks
 
 curated_bp = Blueprint("curated_bp", __name__)
 
-MONGO_URI = os.getenv("MONGO_URI")
-MONGO_DB = os.getenv("MONGO_DB")
+CURATED_FIELDS = [
+    "id", "original_review", "cleaned_review", "label",
+    "word_count", "char_count", "sentiment_score", "sentiment"
+]
+DEFAULT_FIELDS = ["id", "label", "word_count", "char_count", "sentiment_score", "sentiment"]
 
 @curated_bp.route("/", methods=["GET"])
 def get_curated_data():
     try:
-        client = MongoClient(MONGO_URI)
-        db = client[MONGO_DB]
-        collection = db["imdb_reviews"]
+        collection = resources.mongo_db()["imdb_reviews"]
         count = collection.count_documents({})
-        client.close()
         return jsonify({"curated_records_count": count}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+@curated_bp.route("/records", methods=["GET"])
+def get_curated_records():
+    """
+    Parcours paginé de la collection imdb_reviews (pagination keyset sur _id : ?after_id=<dernier id reçu>&limit=N),
+    filtrable par sentiment, plage de sentiment_score (min_score / max_score) et de word_count.
+    """
+    try:
+        after_id, limit = page_args()
+        fields = fields_arg(CURATED_FIELDS, DEFAULT_FIELDS)
+        min_score = float_arg("min_score")
+        max_score = float_arg("max_score")
+        min_word_count = int_arg("min_word_count")
+        max_word_count = int_arg("max_word_count")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    query = {"_id": {"$gt": after_id}}
+    sentiment = request.args.get("sentiment")
+    if sentiment:
+        query["sentiment"] = sentiment
+    score_range = {}
+    if min_score is not None:
+        score_range["$gte"] = min_score
+    if max_score is not None:
+        score_range["$lte"] = max_score
+    if score_range:
+        query["sentiment_score"] = score_range
+    word_count_range = {}
+    if min_word_count is not None:
+        word_count_range["$gte"] = min_word_count
+    if max_word_count is not None:
+        word_count_range["$lte"] = max_word_count
+    if word_count_range:
+        query["word_count"] = word_count_range
+
+    try:
+        collection = resources.mongo_db()["imdb_reviews"]
+        projection = {field: 1 for field in fields}
+        projection["_id"] = 0
+        records = list(collection.find(query, projection).sort("_id", 1).limit(limit))
+        return jsonify({
+            "records": records,
+            "next_after_id": records[-1]["id"] if len(records) == limit else None
+        }), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+@curated_bp.route("/export", methods=["GET"])
+def export_curated_data():
+    """
+    Export complet de la collection en flux : ?format=ndjson|csv|parquet, ?compression=gzip|none
+    (pour Parquet, codec interne : snappy par défaut, ou gzip/zstd), ?batch_size=N, ?fields=...
+    Les documents sont lus par lots depuis un curseur MongoDB et envoyés dès qu'ils sont prêts.
+    """
+    export_format = request.args.get("format", "ndjson")
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"error": f"format inconnu : {export_format}"}), 400
+    compression = request.args.get("compression", "snappy" if export_format == "parquet" else "none")
+    try:
+        batch_size = min(max(int_arg("batch_size", 1000), 1), 10000)
+        fields = fields_arg(CURATED_FIELDS, CURATED_FIELDS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if export_format == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            return jsonify({"error": "l'export Parquet nécessite pyarrow"}), 501
+        if compression not in ("snappy", "gzip", "zstd", "none"):
+            return jsonify({"error": f"compression inconnue : {compression}"}), 400
+    elif compression not in ("gzip", "none"):
+        return jsonify({"error": f"compression inconnue : {compression}"}), 400
+
+    projection = {field: 1 for field in fields}
+    projection["_id"] = 0
+    cursor = resources.mongo_db()["imdb_reviews"].find({}, projection).sort("_id", 1).batch_size(batch_size)
+    batches = iter_batches(cursor, batch_size)
+
+    content_type, extension = EXPORT_FORMATS[export_format]
+    if export_format == "parquet":
+        chunks = parquet_chunks(batches, fields, compression)
+    elif export_format == "csv":
+        chunks = csv_chunks(batches, fields)
+    else:
+        chunks = ndjson_chunks(batches, fields)
+    filename = f"imdb_reviews_curated.{extension}"
+    if compression == "gzip" and export_format != "parquet":
+        chunks = gzip_chunks(chunks)
+        content_type = "application/gzip"
+        filename += ".gz"
+
+    def generate():
+        try:
+            yield from chunks
+        finally:
+            cursor.close()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype=content_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
@@ -1,7 +1,13 @@
 from flask import Blueprint, jsonify
+from resources import resources
 
 health_bp = Blueprint("health_bp", __name__)
 
 @health_bp.route("/", methods=["GET"])
 def health_check():
     return jsonify({"status": "OK"}), 200
+
+@health_bp.route("/pools", methods=["GET"])
+def pools_stats():
+    # Statistiques des pools de connexions partagés, pour la supervision
+    return jsonify(resources.stats()), 200
@@ -0,0 +1,48 @@
+import time
+from flask import Blueprint, Response, current_app, g, request
+from instrumentation import LOG_FORMAT, Metrics, load_saved_metrics, render_prometheus
+from resources import resources
+
+metrics_bp = Blueprint("metrics_bp", __name__)
+
+# Métriques du processus de l'API (requêtes, latences, pool MySQL)
+api_metrics = Metrics("api")
+
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+def record_request(response):
+    """
+    Compte chaque requête et mesure sa latence par endpoint et code HTTP. Pour les réponses
+    en flux (/curated/export), la durée mesurée s'arrête au premier octet envoyé.
+    """
+    start = g.pop("request_start", None)
+    if start is None:
+        return response
+    elapsed = time.perf_counter() - start
+    endpoint = request.endpoint or "not_found"
+    api_metrics.observe("request", elapsed, endpoint=endpoint)
+    api_metrics.count("requests", endpoint=endpoint, method=request.method, status=response.status_code)
+    if LOG_FORMAT == "json":
+        api_metrics.log(
+            "request", method=request.method, path=request.path,
+            status=response.status_code, ms=round(elapsed * 1000, 2)
+        )
+    return response
+
+def init_app(app):
+    app.before_request(start_request_timer)
+    app.after_request(record_request)
+
+@metrics_bp.route("", methods=["GET"])
+def get_metrics():
+    """
+    Métriques au format texte Prometheus : celles de l'API et celles de la dernière exécution
+    de chaque script du pipeline (fichiers écrits dans METRICS_DIR).
+    """
+    mysql_pool = resources.stats()["mysql"]
+    if mysql_pool:
+        for key in ("in_use", "idle", "created"):
+            api_metrics.gauge(f"mysql_pool_{key}", mysql_pool[key])
+    registries = [api_metrics] + load_saved_metrics(current_app.config["METRICS_DIR"])
+    return Response(render_prometheus(registries), mimetype="text/plain; version=0.0.4")
@@ -1,30 +1,143 @@
-from flask import Blueprint, jsonify
-import boto3
+import gzip
+import json
 import os
-from dotenv import load_dotenv
-
-load_dotenv()
+import zlib
+from flask import Blueprint, jsonify, request, current_app
+from resources import resources
+from cache import TTLCache
 
 raw_bp = Blueprint("raw_bp", __name__)
 
-AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
-AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
-AWS_REGION = os.getenv("AWS_REGION", "eu-west-3")
-S3_BUCKET = os.getenv("S3_BUCKET")
-RAW_KEY = "imdb_raw.json"
+RAW_KEY = "imdb_raw.json"  # Ancien format : fichier unique
+RAW_PREFIX = os.getenv("RAW_PREFIX", "imdb_raw")  # Même préfixe S3 que l'ingestion et la transformation Raw -> Staging
+MANIFEST_KEY = f"{RAW_PREFIX}/manifest.json"  # Format par défaut : shards (JSON Lines ou Arrow IPC) décrits par un manifeste
+PREVIEW_CHARS = 1000
+MAX_RECORDS_LIMIT = 500
+
+# Le manifeste change au plus une fois par ingestion : inutile de le relire à chaque requête
+manifest_cache = TTLCache(ttl=60)
+
+def get_manifest(s3, bucket):
+    """Retourne le manifeste des shards raw (mis en cache), ou None si seul l'ancien fichier unique existe."""
+    manifest = manifest_cache.get(bucket)
+    if manifest is None:
+        try:
+            response = s3.get_object(Bucket=bucket, Key=MANIFEST_KEY)
+        except s3.exceptions.NoSuchKey:
+            return None
+        manifest = json.loads(response["Body"].read())
+        manifest_cache.set(bucket, manifest)
+    return manifest
+
+def read_preview(s3, bucket, key, chars=PREVIEW_CHARS):
+    """
+    Lit uniquement le début d'un objet S3 : requête Range sur les premiers octets pour un fichier brut,
+    ou décompression au fil du flux (arrêtée dès que l'aperçu est complet) pour un shard gzip.
+    Un shard Arrow IPC (binaire) est présenté comme ses premiers enregistrements en JSON Lines
+    (seuls le pied du fichier et le premier record batch sont lus).
+    """
+    if key.endswith(".arrow"):
+        lines = []
+        for record in iter_shard_records(s3, bucket, key):
+            lines.append(json.dumps(record, ensure_ascii=False))
+            if sum(len(line) + 1 for line in lines) >= chars:
+                break
+        return "\n".join(lines)[:chars]
+
+    # Un caractère UTF-8 occupe au plus 4 octets
+    max_bytes = chars * 4
+    if not key.endswith(".gz"):
+        response = s3.get_object(Bucket=bucket, Key=key, Range=f"bytes=0-{max_bytes - 1}")
+        return response["Body"].read().decode("utf-8", errors="ignore")[:chars]
+
+    body = s3.get_object(Bucket=bucket, Key=key)["Body"]
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    data = b""
+    try:
+        for chunk in body.iter_chunks(chunk_size=16 * 1024):
+            data += decompressor.decompress(chunk, max_bytes - len(data))
+            if len(data) >= max_bytes:
+                break
+    finally:
+        body.close()
+    return data.decode("utf-8", errors="ignore")[:chars]
+
+def iter_shard_records(s3, bucket, key, start=0):
+    """
+    Lit les enregistrements d'un shard à partir du n° start : ligne par ligne au fil du flux S3 pour un
+    shard JSON Lines ; pour un shard Arrow IPC, par requêtes Range sur le pied du fichier puis sur les
+    seuls record batches contenant les enregistrements demandés (le shard n'est jamais téléchargé en entier).
+    """
+    if key.endswith(".arrow"):
+        from raw_arrow import RAW_SCHEMA, iter_shard_batches
+        for batch in iter_shard_batches(resources.s3_filesystem.open_input_file(f"{bucket}/{key}"), start):
+            for row in batch:
+                yield dict(zip(RAW_SCHEMA.names, row))
+        return
+
+    body = s3.get_object(Bucket=bucket, Key=key)["Body"]
+    try:
+        stream = gzip.GzipFile(fileobj=body) if key.endswith(".gz") else body.iter_lines()
+        position = 0
+        for line in stream:
+            if line.strip():
+                # Les lignes qui précèdent start ne sont pas décodées
+                if position >= start:
+                    yield json.loads(line)
+                position += 1
+    finally:
+        body.close()
 
 @raw_bp.route("/", methods=["GET"])
 def get_raw_data():
     try:
-        s3 = boto3.client(
-            "s3",
-            aws_access_key_id=AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-            region_name=AWS_REGION
-        )
-        response = s3.get_object(Bucket=S3_BUCKET, Key=RAW_KEY)
-        content = response["Body"].read().decode("utf-8")
-        # Renvoie un aperçu (les 1000 premiers caractères) pour éviter de surcharger la réponse
-        return jsonify({"raw_data_preview": content[:1000]}), 200
+        s3 = resources.s3_client
+        bucket = current_app.config["S3_BUCKET"]
+        manifest = get_manifest(s3, bucket)
+        key = manifest["shards"][0]["key"] if manifest and manifest["shards"] else RAW_KEY
+        # Renvoie un aperçu (les 1000 premiers caractères) sans télécharger l'objet complet
+        return jsonify({"raw_data_preview": read_preview(s3, bucket, key)}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@raw_bp.route("/records", methods=["GET"])
+def get_raw_records():
+    """
+    Pagination offset/limit sur les enregistrements raw. Le nombre d'enregistrements par shard
+    (manifeste) permet d'ouvrir directement le shard contenant l'offset demandé.
+    """
+    try:
+        offset = max(int(request.args.get("offset", 0)), 0)
+        limit = min(max(int(request.args.get("limit", 50)), 1), MAX_RECORDS_LIMIT)
+    except ValueError:
+        return jsonify({"error": "offset et limit doivent être des entiers"}), 400
+
+    try:
+        s3 = resources.s3_client
+        bucket = current_app.config["S3_BUCKET"]
+        manifest = get_manifest(s3, bucket)
+        if manifest is None:
+            return jsonify({"error": "la pagination nécessite une couche Raw découpée en shards (INGESTION_MODE=sharded)"}), 409
+
+        records = []
+        shard_start = 0
+        for shard in manifest["shards"]:
+            shard_end = shard_start + shard["records"]
+            if shard_end > offset + len(records):
+                start = offset + len(records) - shard_start
+                for record in iter_shard_records(s3, bucket, shard["key"], start):
+                    records.append(record)
+                    if len(records) >= limit:
+                        break
+            if len(records) >= limit:
+                break
+            shard_start = shard_end
+
+        return jsonify({
+            "offset": offset,
+            "limit": limit,
+            "total": manifest["record_count"],
+            "records": records
+        }), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
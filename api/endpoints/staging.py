@@ -1,31 +1,62 @@
 from flask import Blueprint, jsonify
-import pymysql
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
+from resources import resources
+from query_params import int_arg, page_args, fields_arg
 
 staging_bp = Blueprint("staging_bp", __name__)
 
-MYSQL_HOST = os.getenv("MYSQL_HOST")
-MYSQL_USER = os.getenv("MYSQL_USER")
-MYSQL_PASSWORD = os.getenv("MYSQL_PASSWORD")
-MYSQL_DB = os.getenv("MYSQL_DB")
+STAGING_FIELDS = ["id", "original_review", "cleaned_review", "label", "word_count", "char_count"]
+DEFAULT_FIELDS = ["id", "label", "word_count", "char_count"]
 
 @staging_bp.route("/", methods=["GET"])
 def get_staging_data():
     try:
-        connection = pymysql.connect(
-            host=MYSQL_HOST,
-            user=MYSQL_USER,
-            password=MYSQL_PASSWORD,
-            database=MYSQL_DB,
-            charset='utf8mb4'
-        )
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT COUNT(*) FROM imdb_reviews;")
-            count = cursor.fetchone()[0]
-        connection.close()
+        with resources.mysql_connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT COUNT(*) FROM imdb_reviews;")
+                count = cursor.fetchone()[0]
         return jsonify({"staging_records_count": count}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+@staging_bp.route("/records", methods=["GET"])
+def get_staging_records():
+    """
+    Parcours paginé de la table imdb_reviews (pagination keyset : ?after_id=<dernier id reçu>&limit=N),
+    filtrable par label et par plage de word_count (min_word_count / max_word_count).
+    """
+    try:
+        after_id, limit = page_args()
+        fields = fields_arg(STAGING_FIELDS, DEFAULT_FIELDS)
+        label = int_arg("label")
+        min_word_count = int_arg("min_word_count")
+        max_word_count = int_arg("max_word_count")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    conditions = ["id > %s"]
+    params = [after_id]
+    if label is not None:
+        conditions.append("label = %s")
+        params.append(label)
+    if min_word_count is not None:
+        conditions.append("word_count >= %s")
+        params.append(min_word_count)
+    if max_word_count is not None:
+        conditions.append("word_count <= %s")
+        params.append(max_word_count)
+    params.append(limit)
+    # Les noms de colonnes proviennent de la liste blanche STAGING_FIELDS
+    query = f"SELECT {', '.join(fields)} FROM imdb_reviews WHERE {' AND '.join(conditions)} ORDER BY id LIMIT %s"
+
+    try:
+        with resources.mysql_connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(query, params)
+                rows = cursor.fetchall()
+        records = [dict(zip(fields, row)) for row in rows]
+        return jsonify({
+            "records": records,
+            "next_after_id": records[-1]["id"] if len(records) == limit else None
+        }), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
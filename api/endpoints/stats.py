@@ -1,51 +1,91 @@
-from flask import Blueprint, jsonify
-import pymysql
-from pymongo import MongoClient
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
+from concurrent.futures import ThreadPoolExecutor
+from flask import Blueprint, jsonify, request
+from resources import resources
+from cache import TTLCache
 
 stats_bp = Blueprint("stats_bp", __name__)
 
-# MySQL variables
-MYSQL_HOST = os.getenv("MYSQL_HOST")
-MYSQL_USER = os.getenv("MYSQL_USER")
-MYSQL_PASSWORD = os.getenv("MYSQL_PASSWORD")
-MYSQL_DB = os.getenv("MYSQL_DB")
+# Les comptages sont mis en cache quelques secondes et invalidés à la fin du pipeline (POST /stats/invalidate)
+stats_cache = TTLCache(ttl=30)
 
-# MongoDB variables
-MONGO_URI = os.getenv("MONGO_URI")
-MONGO_DB = os.getenv("MONGO_DB")
+# Les deux backends sont interrogés en parallèle
+executor = ThreadPoolExecutor(max_workers=2)
 
-@stats_bp.route("/", methods=["GET"])
-def get_stats():
-    # Récupérer le nombre d'enregistrements dans la couche Staging (MySQL)
-    try:
-        connection = pymysql.connect(
-            host=MYSQL_HOST,
-            user=MYSQL_USER,
-            password=MYSQL_PASSWORD,
-            database=MYSQL_DB,
-            charset='utf8mb4'
-        )
+@stats_bp.record_once
+def configure_cache(state):
+    stats_cache.ttl = state.app.config.get("STATS_CACHE_TTL", stats_cache.ttl)
+
+def count_staging(exact):
+    """Nombre d'enregistrements dans la couche Staging (MySQL)."""
+    with resources.mysql_connection() as connection:
         with connection.cursor() as cursor:
-            cursor.execute("SELECT COUNT(*) FROM imdb_reviews;")
-            staging_count = cursor.fetchone()[0]
-        connection.close()
-    except Exception as e:
-        staging_count = f"Error: {str(e)}"
-    
-    # Récupérer le nombre d'enregistrements dans la couche Curated (MongoDB)
+            if exact:
+                cursor.execute("SELECT COUNT(*) FROM imdb_reviews;")
+            else:
+                # Estimation issue des statistiques InnoDB : pas de parcours de la table
+                cursor.execute("""
+                SELECT TABLE_ROWS FROM information_schema.TABLES
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'imdb_reviews';
+                """)
+            row = cursor.fetchone()
+    return int(row[0]) if row and row[0] is not None else 0
+
+def count_curated(exact):
+    """Nombre d'enregistrements dans la couche Curated (MongoDB)."""
+    collection = resources.mongo_db()["imdb_reviews"]
+    # estimated_document_count lit les métadonnées de la collection au lieu de la parcourir
+    return collection.count_documents({}) if exact else collection.estimated_document_count()
+
+def safe_count(future):
     try:
-        client = MongoClient(MONGO_URI)
-        db = client[MONGO_DB]
-        curated_count = db["imdb_reviews"].count_documents({})
-        client.close()
+        return future.result()
     except Exception as e:
-        curated_count = f"Error: {str(e)}"
-    
-    return jsonify({
-        "staging_records_count": staging_count,
-        "curated_records_count": curated_count
-    }), 200
+        return f"Error: {str(e)}"
+
+@stats_bp.route("/", methods=["GET"])
+def get_stats():
+    # ?exact=true force un comptage exact (plus coûteux) au lieu des métadonnées des deux bases
+    exact = request.args.get("exact", "false").lower() in ("1", "true", "yes")
+    cached = stats_cache.get(exact)
+    cache_status = "HIT"
+    if cached is None:
+        cache_status = "MISS"
+        staging_future = executor.submit(count_staging, exact)
+        curated_future = executor.submit(count_curated, exact)
+        cached = {
+            "staging_records_count": safe_count(staging_future),
+            "curated_records_count": safe_count(curated_future)
+        }
+        # Les erreurs ne sont pas mises en cache
+        if all(isinstance(value, int) for value in cached.values()):
+            stats_cache.set(exact, cached)
+
+    response = jsonify(cached)
+    response.headers["X-Cache"] = cache_status
+    response.headers["X-Stats-Exact"] = str(exact).lower()
+    return response, 200
+
+@stats_bp.route("/analytics", methods=["GET"])
+def get_analytics():
+    # Agrégats matérialisés par transform_staging_to_curated : une seule lecture du document "global"
+    cached = stats_cache.get("analytics")
+    cache_status = "HIT"
+    if cached is None:
+        cache_status = "MISS"
+        try:
+            cached = resources.mongo_db()["imdb_reviews_summary"].find_one({"_id": "global"}, {"_id": 0, "type": 0})
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+        if cached is None:
+            return jsonify({"error": "aucun agrégat disponible : le pipeline n'a pas encore été exécuté"}), 404
+        stats_cache.set("analytics", cached)
+
+    response = jsonify(cached)
+    response.headers["X-Cache"] = cache_status
+    return response, 200
+
+@stats_bp.route("/invalidate", methods=["POST"])
+def invalidate_stats():
+    # Appelé en fin de pipeline pour que les nouveaux comptages soient visibles immédiatement
+    stats_cache.clear()
+    return jsonify({"status": "invalidated"}), 200
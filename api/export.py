@@ -0,0 +1,91 @@
+import csv
+import io
+import json
+import zlib
+from itertools import islice
+
+# Schéma des documents curated, utilisé pour l'export Parquet
+CURATED_TYPES = {
+    "id": "int64",
+    "original_review": "string",
+    "cleaned_review": "string",
+    "label": "int64",
+    "word_count": "int64",
+    "char_count": "int64",
+    "sentiment_score": "float64",
+    "sentiment": "string",
+}
+
+def iter_batches(cursor, batch_size):
+    """Regroupe les documents d'un curseur MongoDB en listes de batch_size documents."""
+    while True:
+        batch = list(islice(cursor, batch_size))
+        if not batch:
+            return
+        yield batch
+
+def ndjson_chunks(batches, fields):
+    for batch in batches:
+        yield "".join(
+            json.dumps({field: doc.get(field) for field in fields}, ensure_ascii=False) + "\n"
+            for doc in batch
+        ).encode("utf-8")
+
+def csv_chunks(batches, fields):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for batch in batches:
+        writer.writerows([doc.get(field) for field in fields] for doc in batch)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate(0)
+    # En-tête seul si l'export est vide
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+class ChunkSink(io.RawIOBase):
+    """Fichier en écriture seule qui accumule les octets écrits jusqu'à ce qu'ils soient récupérés par drain()."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+def parquet_chunks(batches, fields, compression):
+    """Écrit un row group Parquet par lot et transmet les octets produits au fur et à mesure."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(field, CURATED_TYPES[field]) for field in fields])
+    sink = ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression=compression)
+    for batch in batches:
+        columns = {field: [doc.get(field) for doc in batch] for field in fields}
+        writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+def gzip_chunks(chunks):
+    """Compresse en gzip un flux d'octets, morceau par morceau."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,24 @@
+from flask import current_app, request
+
+# Endpoints toujours servis à jour : état de santé et supervision
+NO_STORE_BLUEPRINTS = {"health_bp", "metrics_bp"}
+
+def add_cache_headers(response):
+    """
+    Ajoute aux réponses JSON un ETag (empreinte du corps) et un Cache-Control (HTTP_CACHE_MAX_AGE
+    secondes, sauf si l'endpoint a fixé le sien), puis répond 304 sans corps à une requête
+    conditionnelle (If-None-Match) dont l'ETag correspond. Les exports en flux ne sont pas concernés.
+    """
+    if request.method not in ("GET", "HEAD") or response.status_code != 200 or response.is_streamed:
+        return response
+    if request.blueprint in NO_STORE_BLUEPRINTS:
+        response.cache_control.no_store = True
+        return response
+    if "Cache-Control" not in response.headers:
+        response.cache_control.private = True
+        response.cache_control.max_age = current_app.config["HTTP_CACHE_MAX_AGE"]
+    response.add_etag()
+    return response.make_conditional(request)
+
+def init_app(app):
+    app.after_request(add_cache_headers)
@@ -0,0 +1,44 @@
+from flask import request
+
+MAX_PAGE_SIZE = 500
+
+def int_arg(name, default=None):
+    """Lit un paramètre entier de la query string ; lève ValueError s'il est invalide."""
+    value = request.args.get(name)
+    if value is None or value == "":
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"le paramètre '{name}' doit être un entier")
+
+def float_arg(name, default=None):
+    """Lit un paramètre décimal de la query string ; lève ValueError s'il est invalide."""
+    value = request.args.get(name)
+    if value is None or value == "":
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"le paramètre '{name}' doit être un nombre")
+
+def page_args():
+    """Paramètres de pagination keyset : after_id (dernier id de la page précédente) et limit (borné)."""
+    after_id = int_arg("after_id", -1)
+    limit = min(max(int_arg("limit", 50), 1), MAX_PAGE_SIZE)
+    return after_id, limit
+
+def fields_arg(allowed, default):
+    """
+    Projection demandée via ?fields=a,b,c, limitée aux champs autorisés.
+    Par défaut, les champs texte volumineux ne sont pas renvoyés.
+    """
+    value = request.args.get("fields")
+    if not value:
+        return list(default)
+    fields = [field.strip() for field in value.split(",") if field.strip()]
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise ValueError(f"champs inconnus : {', '.join(unknown)}")
+    # L'id est toujours renvoyé : il sert de curseur pour la page suivante
+    return ["id"] + [field for field in fields if field != "id"]
@@ -0,0 +1,225 @@
+import queue
+import threading
+from contextlib import contextmanager
+import boto3
+import pymysql
+from pymongo import MongoClient
+
+class PoolTimeout(Exception):
+    """Aucune connexion MySQL disponible dans le délai imparti."""
+
+class MySQLPool:
+    """
+    Pool borné de connexions pymysql partagé par les requêtes de l'API.
+    Les connexions sont créées à la demande jusqu'à max_size, puis réutilisées ;
+    au-delà, une requête attend au plus timeout secondes qu'une connexion soit rendue.
+    """
+
+    def __init__(self, max_size, timeout, **connect_kwargs):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._connect_kwargs = connect_kwargs
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+        self._acquired = 0
+        self._waits = 0
+        self._timeouts = 0
+
+    def _acquire(self):
+        with self._lock:
+            self._acquired += 1
+            if self._idle.empty() and self._created < self.max_size:
+                self._created += 1
+                self._in_use += 1
+                create = True
+            else:
+                create = False
+        if create:
+            try:
+                return pymysql.connect(**self._connect_kwargs)
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                    self._in_use -= 1
+                raise
+
+        try:
+            connection = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                self._waits += 1
+            try:
+                connection = self._idle.get(timeout=self.timeout)
+            except queue.Empty:
+                with self._lock:
+                    self._timeouts += 1
+                raise PoolTimeout(f"Aucune connexion MySQL disponible après {self.timeout} s.")
+        with self._lock:
+            self._in_use += 1
+        try:
+            # Une connexion restée inactive a pu être fermée par le serveur
+            connection.ping(reconnect=True)
+        except Exception:
+            self._discard(connection)
+            raise
+        return connection
+
+    def _discard(self, connection):
+        """Ferme une connexion inutilisable et la retire du pool."""
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._created -= 1
+            self._in_use -= 1
+
+    def _release(self, connection):
+        """Rend une connexion au pool ; une transaction ouverte explicitement ne doit pas survivre à son retour."""
+        try:
+            connection.rollback()
+        except Exception:
+            self._discard(connection)
+            return
+        with self._lock:
+            self._in_use -= 1
+        self._idle.put(connection)
+
+    @contextmanager
+    def connection(self):
+        """
+        Prête une connexion du pool le temps d'un bloc with. Elle est rendue au pool à la sortie, y compris
+        si le bloc lève une erreur applicative ; seule une erreur de connexion (OperationalError,
+        InterfaceError) la fait jeter.
+        """
+        connection = self._acquire()
+        broken = False
+        try:
+            yield connection
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+            broken = True
+            raise
+        finally:
+            if broken:
+                self._discard(connection)
+            else:
+                self._release(connection)
+
+    def close(self):
+        while not self._idle.empty():
+            self._idle.get_nowait().close()
+            with self._lock:
+                self._created -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_size": self.max_size,
+                "created": self._created,
+                "in_use": self._in_use,
+                "idle": self._idle.qsize(),
+                "acquired_total": self._acquired,
+                "waits_total": self._waits,
+                "timeouts_total": self._timeouts,
+            }
+
+class Resources:
+    """
+    Ressources partagées par tous les blueprints : un pool MySQL borné, un MongoClient unique
+    (qui gère son propre pool de connexions) et un client S3 réutilisable.
+    Elles sont créées au premier usage à partir de la configuration de l'application.
+    """
+
+    def __init__(self):
+        self.config = {}
+        self._lock = threading.Lock()
+        self._mysql_pool = None
+        self._mongo_client = None
+        self._s3_client = None
+        self._s3_filesystem = None
+
+    def init_app(self, app):
+        self.config = app.config
+        app.extensions["resources"] = self
+
+    @property
+    def mysql_pool(self):
+        with self._lock:
+            if self._mysql_pool is None:
+                self._mysql_pool = MySQLPool(
+                    self.config["MYSQL_POOL_SIZE"],
+                    self.config["MYSQL_POOL_TIMEOUT"],
+                    host=self.config["MYSQL_HOST"],
+                    user=self.config["MYSQL_USER"],
+                    password=self.config["MYSQL_PASSWORD"],
+                    database=self.config["MYSQL_DB"],
+                    charset='utf8mb4',
+                    connect_timeout=self.config["MYSQL_POOL_TIMEOUT"],
+                    # L'API ne fait que lire : chaque requête SQL voit les dernières données validées
+                    # (pas de transaction laissée ouverte sur un instantané REPEATABLE READ)
+                    autocommit=True
+                )
+            return self._mysql_pool
+
+    def mysql_connection(self):
+        """Raccourci : with resources.mysql_connection() as connection: ..."""
+        return self.mysql_pool.connection()
+
+    @property
+    def mongo_client(self):
+        with self._lock:
+            if self._mongo_client is None:
+                self._mongo_client = MongoClient(
+                    self.config["MONGO_URI"],
+                    maxPoolSize=self.config["MONGO_POOL_SIZE"],
+                    serverSelectionTimeoutMS=self.config["MONGO_TIMEOUT_MS"]
+                )
+            return self._mongo_client
+
+    def mongo_db(self):
+        return self.mongo_client[self.config["MONGO_DB"]]
+
+    @property
+    def s3_client(self):
+        # Les clients boto3 sont thread-safe : un seul client sert toutes les requêtes
+        with self._lock:
+            if self._s3_client is None:
+                self._s3_client = boto3.client(
+                    "s3",
+                    aws_access_key_id=self.config["AWS_ACCESS_KEY_ID"],
+                    aws_secret_access_key=self.config["AWS_SECRET_ACCESS_KEY"],
+                    region_name=self.config["AWS_REGION"]
+                )
+            return self._s3_client
+
+    @property
+    def s3_filesystem(self):
+        # Système de fichiers S3 de pyarrow : lecture par plages (Range) des shards Arrow IPC
+        with self._lock:
+            if self._s3_filesystem is None:
+                from pyarrow import fs
+                self._s3_filesystem = fs.S3FileSystem(
+                    access_key=self.config["AWS_ACCESS_KEY_ID"],
+                    secret_key=self.config["AWS_SECRET_ACCESS_KEY"],
+                    region=self.config["AWS_REGION"]
+                )
+            return self._s3_filesystem
+
+    def stats(self):
+        """Statistiques des pools, exposées pour la supervision."""
+        stats = {"mysql": self._mysql_pool.stats() if self._mysql_pool else None, "mongo": None}
+        if self._mongo_client is not None:
+            options = self._mongo_client.options.pool_options
+            stats["mongo"] = {"max_pool_size": options.max_pool_size, "min_pool_size": options.min_pool_size}
+        stats["s3_client_ready"] = self._s3_client is not None
+        return stats
+
+    def close(self):
+        if self._mysql_pool is not None:
+            self._mysql_pool.close()
+        if self._mongo_client is not None:
+            self._mongo_client.close()
+
+resources = Resources()
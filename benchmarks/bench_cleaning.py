@@ -0,0 +1,71 @@
+"""
+Compare les deux moteurs de nettoyage de la couche Staging (CLEAN_BACKEND=python et CLEAN_BACKEND=arrow)
+sur le corpus IMDB et vérifie qu'ils produisent exactement les mêmes enregistrements.
+
+Exemples :
+    python benchmarks/bench_cleaning.py --limit 25000
+    python benchmarks/bench_cleaning.py --input reviews.jsonl --batch-size 2000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+import transform_raw_to_staging as staging
+from lemma_cache import LemmaCache
+from nltk_resources import get_lemmatizer
+
+def load_reviews(input_path, limit):
+    """
+    Critiques IMDB (split train) depuis Hugging Face, ou depuis un fichier JSON Lines contenant un champ "text"
+    (et éventuellement "label"), sous forme de tuples (id, texte, label).
+    """
+    if input_path:
+        with open(input_path, encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        texts, labels = [row["text"] for row in rows], [row.get("label", -1) for row in rows]
+    else:
+        from datasets import load_dataset
+        split = load_dataset("imdb", split="train")
+        texts, labels = split["text"], split["label"]
+    if limit:
+        texts, labels = texts[:limit], labels[:limit]
+    return [(idx, text, label) for idx, (text, label) in enumerate(zip(texts, labels), start=1)]
+
+def run(backend, reviews, batch_size):
+    """Nettoie toutes les critiques avec un cache de lemmes vide ; retourne (enregistrements, durée, stats du cache)."""
+    staging.CLEAN_BACKEND = backend
+    staging.lemma_cache = LemmaCache(get_lemmatizer().lemmatize, max_size=staging.LEMMA_CACHE_SIZE)
+    start = time.perf_counter()
+    records = list(staging.clean_records(reviews, chunk_size=batch_size))
+    return records, time.perf_counter() - start, staging.lemma_cache.stats()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", help="fichier JSON Lines de critiques (par défaut : dataset IMDB)")
+    parser.add_argument("--limit", type=int, default=0, help="nombre maximal de critiques (0 = toutes)")
+    parser.add_argument("--batch-size", type=int, default=staging.CLEAN_CHUNK_SIZE, help="taille des lots du moteur arrow")
+    args = parser.parse_args()
+
+    reviews = load_reviews(args.input, args.limit)
+    # Force le chargement de WordNet avant la première mesure
+    get_lemmatizer().lemmatize("reviews")
+    print(f"{len(reviews)} critiques, lots de {args.batch_size}")
+
+    results = {}
+    for backend in ("python", "arrow"):
+        records, elapsed, cache_stats = run(backend, reviews, args.batch_size)
+        results[backend] = records
+        print(f"{backend:>6} : {elapsed:.2f} s, {len(records) / elapsed:,.0f} critiques/s, cache de lemmes {cache_stats}")
+
+    if results["python"] != results["arrow"]:
+        mismatches = sum(1 for a, b in zip(results["python"], results["arrow"]) if a != b)
+        print(f"ÉCHEC : {mismatches} enregistrements diffèrent entre les deux moteurs")
+        sys.exit(1)
+    print("Sorties identiques")
+
+if __name__ == "__main__":
+    main()
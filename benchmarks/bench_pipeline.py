@@ -0,0 +1,357 @@
+"""
+Benchmark de bout en bout des trois étapes du pipeline (ingestion, Raw -> Staging, Staging -> Curated)
+sur un corpus synthétique, sans AWS ni bases de données : S3 est simulé par moto, MySQL par SQLite
+et MongoDB par mongomock (voir standins.py). --mysql et --mongo-uri permettent d'utiliser à la place
+un serveur MySQL (variables MYSQL_* habituelles) ou un mongod local.
+
+Pour chaque étape, le fichier de résultats JSON contient le débit (enregistrements/s), le pic de mémoire
+résidente et le temps exclusif passé dans chaque phase (serialize, upload, download, parse, diff, clean,
+lemmatize, insert, read, enrich, write...). Les phases exécutées dans des threads (upload des shards,
+écritures MongoDB parallèles) sont cumulées par thread et peuvent dépasser la durée de l'étape ; celles
+exécutées dans les processus workers (CLEAN_WORKERS, ENRICH_WORKERS > 1) ne sont visibles que comme
+temps d'attente du processus principal.
+
+Exemples :
+    python benchmarks/bench_pipeline.py --records 20000
+    python benchmarks/bench_pipeline.py --records 50000 --workers 4 --output results.json
+"""
+import argparse
+import functools
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "scripts"))
+sys.path.insert(0, BENCH_DIR)
+
+BUCKET = "bench-datalake"
+REGION = "eu-west-3"
+
+# Vocabulaire du corpus synthétique : formes fléchies (pour la lemmatisation), balises HTML et ponctuation
+VOCABULARY = (
+    "the a this that movie movies film films actor actors actress plot plots story stories scene scenes "
+    "was were is are been being great greater greatest bad worse worst good better best boring loved "
+    "hated watching watched watches director directors ending endings character characters funny "
+    "scary laughs cried music songs dialogue effects camera performances performance really very not "
+    "never always again time times people thought thinks minutes hours"
+).split()
+DECORATIONS = ["<br /><br />", "!", "...", ",", "?", "(10/10)", "\"", "don't", "it's"]
+
+def synthetic_reviews(count, avg_words, seed):
+    """Génère count critiques {"id", "text", "label"} reproductibles (même graine, même corpus)."""
+    rng = random.Random(seed)
+    for idx in range(count):
+        length = max(1, int(rng.gauss(avg_words, avg_words / 3)))
+        words = rng.choices(VOCABULARY, k=length)
+        for _ in range(length // 20):
+            words.insert(rng.randrange(len(words) + 1), rng.choice(DECORATIONS))
+        text = " ".join(words)
+        yield {"id": idx, "text": text[0].upper() + text[1:] + ".", "label": rng.randint(0, 1)}
+
+class PhaseTimer:
+    """
+    Mesure le temps exclusif passé dans chaque phase : quand une phase en appelle une autre
+    (par exemple un générateur de lecture consommé pendant l'enrichissement), le temps est attribué
+    à la phase la plus interne. Une pile par thread.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.seconds = defaultdict(float)
+        self.calls = Counter()
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def _add(self, phase, seconds):
+        with self._lock:
+            self.seconds[phase] += seconds
+
+    def enter(self, phase):
+        now = time.perf_counter()
+        stack = self._stack()
+        if stack:
+            self._add(stack[-1][0], now - stack[-1][1])
+        stack.append([phase, now])
+        with self._lock:
+            self.calls[phase] += 1
+
+    def exit(self):
+        now = time.perf_counter()
+        stack = self._stack()
+        phase, start = stack.pop()
+        self._add(phase, now - start)
+        if stack:
+            stack[-1][1] = now
+
+    def wrap(self, phase, fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            self.enter(phase)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.exit()
+        return wrapper
+
+    def wrap_generator(self, phase, fn):
+        """Comme wrap, pour une fonction génératrice : seul le temps passé à produire chaque élément est compté."""
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            generator = fn(*args, **kwargs)
+            try:
+                while True:
+                    self.enter(phase)
+                    try:
+                        item = next(generator)
+                    except StopIteration:
+                        return
+                    finally:
+                        self.exit()
+                    yield item
+            finally:
+                generator.close()
+        return wrapper
+
+    def report(self):
+        return {
+            phase: {"seconds": round(self.seconds[phase], 4), "calls": self.calls[phase]}
+            for phase in sorted(self.seconds, key=self.seconds.get, reverse=True)
+        }
+
+class TimedJson:
+    """Module json dont loads est chronométré (phase "parse")."""
+
+    def __init__(self, timer):
+        self.loads = timer.wrap("parse", json.loads)
+
+    def __getattr__(self, name):
+        return getattr(json, name)
+
+class RssSampler:
+    """Relève la mémoire résidente du processus toutes les interval secondes et en garde le maximum."""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak_kb = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @staticmethod
+    def current_kb():
+        try:
+            with open("/proc/self/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1])
+        except OSError:
+            pass
+        # Hors Linux : pic depuis le démarrage du processus
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_kb = max(self.peak_kb, self.current_kb())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak_kb = max(self.peak_kb, self.current_kb())
+
+@contextmanager
+def patched(targets):
+    """Remplace temporairement des attributs : targets est une liste de (objet, attribut, nouvelle valeur)."""
+    originals = [(owner, name, getattr(owner, name)) for owner, name, _ in targets]
+    for owner, name, value in targets:
+        setattr(owner, name, value)
+    try:
+        yield
+    finally:
+        for owner, name, value in reversed(originals):
+            setattr(owner, name, value)
+
+def run_stage(name, fn, count_records, targets, timer):
+    """
+    Exécute une étape instrumentée et retourne ses mesures. Une étape qui échoue (code de retour non nul
+    d'un script) arrête le benchmark avec ce code, sans écrire de fichier de résultats.
+    """
+    with patched(targets), RssSampler() as rss:
+        start = time.perf_counter()
+        status = fn()
+        wall = time.perf_counter() - start
+    if status:
+        print(f"ÉCHEC : l'étape {name} a retourné le code {status}, benchmark interrompu")
+        sys.exit(status)
+    records = count_records()
+    phases = timer.report()
+    print(f"[{name}] {records} enregistrements en {wall:.2f} s ({records / wall:,.0f}/s), pic RSS {rss.peak_kb / 1024:.0f} Mo")
+    return {
+        "records": records,
+        "wall_seconds": round(wall, 4),
+        "records_per_sec": round(records / wall, 1) if wall else None,
+        "peak_rss_kb": rss.peak_kb,
+        "phases": phases,
+        "unattributed_seconds": round(max(wall - sum(p["seconds"] for p in phases.values()), 0), 4),
+    }
+
+def configure_environment(args, workdir):
+    """Variables lues par les scripts à l'import : à définir avant de les importer."""
+    os.environ.update({
+        "AWS_ACCESS_KEY_ID": "bench",
+        "AWS_SECRET_ACCESS_KEY": "bench",
+        "AWS_REGION": REGION,
+        "S3_BUCKET": BUCKET,
+        "STAGING_LOAD_MODE": "upsert",
+        "FULL_REFRESH": "1",
+        "LEMMA_CACHE_PATH": "",
+        "CLEAN_WORKERS": str(args.workers),
+        "ENRICH_WORKERS": str(args.workers),
+        "SHARD_MAX_BYTES": str(args.shard_bytes),
+        "SHARD_FORMAT": args.shard_format,
+    })
+    if not args.mysql:
+        os.environ.update({"MYSQL_HOST": "sqlite", "MYSQL_USER": "", "MYSQL_PASSWORD": "", "MYSQL_DB": "bench"})
+    os.environ["MONGO_URI"] = args.mongo_uri or "mongodb://standin"
+    os.environ.setdefault("MONGO_DB", "datalake_bench")
+    os.environ["TMPDIR"] = workdir
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=10000, help="taille du corpus synthétique")
+    parser.add_argument("--avg-words", type=int, default=230, help="longueur moyenne d'une critique (mots)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=1, help="CLEAN_WORKERS et ENRICH_WORKERS (1 = phases toutes visibles)")
+    parser.add_argument("--shard-bytes", type=int, default=8 * 1024 * 1024, help="SHARD_MAX_BYTES")
+    parser.add_argument("--shard-format", choices=("jsonl", "arrow"), default="jsonl", help="SHARD_FORMAT des shards raw")
+    parser.add_argument("--mysql", action="store_true", help="utiliser le serveur MySQL des variables MYSQL_* au lieu de SQLite")
+    parser.add_argument("--mongo-uri", help="utiliser ce serveur MongoDB au lieu de mongomock")
+    parser.add_argument("--output", help="fichier de résultats (par défaut benchmarks/results/pipeline-<date>.json)")
+    args = parser.parse_args()
+
+    started_at = datetime.now(timezone.utc)
+    output = args.output or os.path.join(BENCH_DIR, "results", f"pipeline-{started_at:%Y%m%dT%H%M%SZ}.json")
+    workdir = tempfile.mkdtemp(prefix="datalake-bench-")
+    configure_environment(args, workdir)
+
+    import boto3
+    import pymysql
+    from moto import mock_aws
+    import ingestion
+    import transform_raw_to_staging as staging
+    import transform_staging_to_curated as curated
+    import raw_arrow
+    from standins import sqlite_connect, mongomock_client_class
+
+    connect = pymysql.connect if args.mysql else sqlite_connect(os.path.join(workdir, "staging.sqlite3"))
+    mongo_client = (curated.MongoClient if args.mongo_uri else mongomock_client_class())(os.environ["MONGO_URI"])
+    results = {
+        "benchmark": "pipeline",
+        "started_at": started_at.isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": {
+            "records": args.records,
+            "avg_words": args.avg_words,
+            "seed": args.seed,
+            "workers": args.workers,
+            "shard_bytes": args.shard_bytes,
+            "shard_format": args.shard_format,
+            "mysql": "mysql" if args.mysql else "sqlite",
+            "mongo": "mongod" if args.mongo_uri else "mongomock",
+            "s3": "moto",
+        },
+        "stages": {},
+    }
+
+    def count_staging():
+        connection = connect(host=staging.MYSQL_HOST, user=staging.MYSQL_USER, password=staging.MYSQL_PASSWORD, database=staging.MYSQL_DB)
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT COUNT(*) FROM imdb_reviews")
+                return cursor.fetchone()[0]
+        finally:
+            connection.close()
+
+    with mock_aws():
+        s3 = boto3.client("s3", region_name=REGION)
+        s3.create_bucket(Bucket=BUCKET, CreateBucketConfiguration={"LocationConstraint": REGION})
+        manifest = {}
+
+        timer = PhaseTimer()
+        results["stages"]["ingestion"] = run_stage(
+            "ingestion",
+            lambda: manifest.update(ingestion.ingest_sharded(BUCKET, synthetic_reviews(args.records, args.avg_words, args.seed))),
+            lambda: manifest.get("record_count", 0),
+            [
+                (ingestion.ShardWriter, "write", timer.wrap("serialize", ingestion.ShardWriter.write)),
+                (ingestion, "upload_shard", timer.wrap("upload", ingestion.upload_shard)),
+            ],
+            timer,
+        )
+
+        timer = PhaseTimer()
+        results["stages"]["staging"] = run_stage(
+            "staging",
+            staging.main,
+            count_staging,
+            [
+                (pymysql, "connect", connect),
+                (staging, "json", TimedJson(timer)),
+                (staging, "iter_shard_records", timer.wrap_generator("download", staging.iter_shard_records)),
+                (staging, "iter_arrow_shard_reviews", timer.wrap_generator("download", staging.iter_arrow_shard_reviews)),
+                (raw_arrow, "iter_shard_batches", timer.wrap_generator("parse", raw_arrow.iter_shard_batches)),
+                (staging, "fetch_existing_hashes", timer.wrap("diff", staging.fetch_existing_hashes)),
+                (staging, "clean_records", timer.wrap_generator("clean", staging.clean_records)),
+                (staging.lemma_cache, "_lemmatize", timer.wrap("lemmatize", staging.lemma_cache._lemmatize)),
+                (staging.StagingLoader, "load", timer.wrap("insert", staging.StagingLoader.load)),
+                (staging.StagingLoader, "finish", timer.wrap("insert", staging.StagingLoader.finish)),
+                (staging, "save_checkpoint", timer.wrap("checkpoint", staging.save_checkpoint)),
+            ],
+            timer,
+        )
+
+    timer = PhaseTimer()
+    results["stages"]["curated"] = run_stage(
+        "curated",
+        curated.main,
+        lambda: mongo_client[curated.MONGO_DB]["imdb_reviews"].count_documents({}),
+        [
+            (pymysql, "connect", connect),
+            (curated, "MongoClient", lambda *args, **kwargs: mongo_client),
+            (mongo_client, "close", lambda: None),
+            (curated, "iter_data_from_mysql", timer.wrap_generator("read", curated.iter_data_from_mysql)),
+            (curated, "enrich_records", timer.wrap_generator("enrich", curated.enrich_records)),
+            (curated, "write_batch", timer.wrap("write", curated.write_batch)),
+            (curated, "save_summary", timer.wrap("summary", curated.save_summary)),
+        ],
+        timer,
+    )
+
+    # Pic des processus workers terminés (CLEAN_WORKERS / ENRICH_WORKERS > 1)
+    results["peak_worker_rss_kb"] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Résultats écrits dans {output}")
+
+if __name__ == "__main__":
+    main()
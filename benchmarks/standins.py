@@ -0,0 +1,101 @@
+"""
+Substituts locaux de S3, MySQL et MongoDB pour les benchmarks du pipeline :
+- S3 : moto (en mémoire, dans le processus)
+- MySQL : SQLite, derrière une connexion compatible pymysql qui traduit le dialecte MySQL utilisé par les scripts
+- MongoDB : mongomock
+"""
+import functools
+import re
+import sqlite3
+
+MYSQL_INDEX_CLAUSE = re.compile(r",\s*INDEX\s+\w+\s*\(\w+\)", re.IGNORECASE)
+MYSQL_VALUES_FUNCTION = re.compile(r"VALUES\((\w+)\)")
+
+# Requêtes information_schema des scripts (schéma Staging, cache de sentiment), réécrites avec les pragmas SQLite
+INFORMATION_SCHEMA_QUERIES = {
+    "TABLES": "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = ?",
+    "COLUMNS": "SELECT COUNT(*) FROM pragma_table_info('imdb_reviews') WHERE name = 'content_hash'",
+    "STATISTICS": "SELECT name FROM pragma_index_list('imdb_reviews')",
+}
+
+def translate_mysql(query):
+    """Réécrit une requête des scripts (dialecte MySQL, paramètres %s) pour SQLite."""
+    for table, replacement in INFORMATION_SCHEMA_QUERIES.items():
+        if f"information_schema.{table}" in query:
+            return replacement
+    query = MYSQL_INDEX_CLAUSE.sub("", query)
+    query = query.replace("ON DUPLICATE KEY UPDATE", "ON CONFLICT DO UPDATE SET")
+    query = MYSQL_VALUES_FUNCTION.sub(r"excluded.\1", query)
+    query = query.replace("UTC_TIMESTAMP()", "CURRENT_TIMESTAMP")
+    return query.replace("%s", "?")
+
+class SQLiteCursor:
+    """Curseur au comportement de pymysql (gestionnaire de contexte, rowcount, fetchone/fetchall)."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._cursor.close()
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def execute(self, query, args=None):
+        return self._cursor.execute(translate_mysql(query), tuple(args or ()))
+
+    def executemany(self, query, rows):
+        return self._cursor.executemany(translate_mysql(query), rows)
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+class SQLiteConnection:
+    """Connexion SQLite exposant l'interface pymysql utilisée par les scripts de transformation."""
+
+    def __init__(self, path):
+        self.path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+
+    def cursor(self):
+        return SQLiteCursor(self._connection.cursor())
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def close(self):
+        self._connection.close()
+
+def sqlite_connect(path):
+    """Fabrique à substituer à pymysql.connect : les paramètres de connexion MySQL sont ignorés."""
+    def connect(**kwargs):
+        return SQLiteConnection(path)
+    return connect
+
+def _ignore_sort(method):
+    # pymongo >= 4.11 transmet sort= aux opérations de bulk_write, que mongomock ne connaît pas encore
+    @functools.wraps(method)
+    def wrapper(*args, sort=None, **kwargs):
+        return method(*args, **kwargs)
+    return wrapper
+
+def mongomock_client_class():
+    """Retourne mongomock.MongoClient, rendu compatible avec les ReplaceOne de la version installée de pymongo."""
+    import mongomock
+    from mongomock.collection import BulkOperationBuilder
+
+    for name in ("add_replace", "add_update"):
+        method = getattr(BulkOperationBuilder, name)
+        if not hasattr(method, "__wrapped__"):
+            setattr(BulkOperationBuilder, name, _ignore_sort(method))
+    return mongomock.MongoClient
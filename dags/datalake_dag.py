@@ -1,7 +1,14 @@
+import logging
+import os
+import sys
 from datetime import datetime
-from airflow import DAG
+from airflow.decorators import dag, task, task_group
+from airflow.exceptions import AirflowException
+from airflow.hooks.subprocess import SubprocessHook
 from airflow.operators.bash import BashOperator
 
+log = logging.getLogger(__name__)
+
 # Paramètres par défaut pour le DAG
 default_args = {
     'owner': 'airflow',
@@ -9,38 +16,118 @@ default_args = {
     'retries': 1,
 }
 
-dag = DAG(
-    'datalake_pipeline',
-    default_args=default_args,
-    description='Pipeline d’intégration du Data Lake : ingestion, transformation raw->staging, transformation staging->curated',
-    schedule_interval='@daily',  # Vous pouvez changer la fréquence ou mettre None pour une exécution manuelle
-    catchup=False
-)
-
 # Chemin absolu vers le dossier de votre projet.
 # Remplacez ce chemin par le chemin absolu sur votre machine.
 project_path = "C:/Users/dinel/OneDrive/Bureau/DataLake_Project/projet-datalake-imdb"
 
-# Tâche 1 : Ingestion des données (couche Raw)
-ingest_task = BashOperator(
-    task_id='ingest_data',
-    bash_command=f'python "{project_path}/scripts/ingestion.py"',
-    dag=dag
-)
+# URL de l'API Flask, notifiée en fin de pipeline pour invalider son cache de statistiques.
+# Depuis les conteneurs Airflow, localhost désigne le conteneur lui-même : voir DATALAKE_API_URL dans docker-compose.yaml
+api_url = os.getenv("DATALAKE_API_URL", "http://localhost:5000")
 
-# Tâche 2 : Transformation Raw -> Staging
-transform_raw_task = BashOperator(
-    task_id='transform_raw_to_staging',
-    bash_command=f'python "{project_path}/scripts/transform_raw_to_staging.py"',
-    dag=dag
-)
+# Nombre maximal de partitions (groupes de shards raw) traitées en parallèle
+PIPELINE_PARTITIONS = int(os.getenv("PIPELINE_PARTITIONS", 4))
+
+# Processus de nettoyage / d'enrichissement par partition : les partitions s'exécutent en parallèle
+# et se partagent les cœurs (CLEAN_WORKERS / ENRICH_WORKERS explicites dans l'environnement prioritaires)
+PARTITION_WORKERS = max(1, (os.cpu_count() or 1) // PIPELINE_PARTITIONS)
+
+def run_python(script, env, label):
+    """Exécute un script du pipeline ; un code de sortie non nul fait échouer la tâche (et la relance)."""
+    result = SubprocessHook().run_command(
+        [sys.executable, f"{project_path}/scripts/{script}"],
+        env=env,
+        cwd=project_path
+    )
+    if result.exit_code != 0:
+        raise AirflowException(f"{script} ({label}) a échoué avec le code {result.exit_code}")
 
-# Tâche 3 : Transformation Staging -> Curated
-transform_staging_task = BashOperator(
-    task_id='transform_staging_to_curated',
-    bash_command=f'python "{project_path}/scripts/transform_staging_to_curated.py"',
-    dag=dag
+def run_script(script, partition):
+    """Exécute un script du pipeline pour une partition."""
+    env = {
+        "CLEAN_WORKERS": str(PARTITION_WORKERS),
+        "ENRICH_WORKERS": str(PARTITION_WORKERS),
+        **os.environ,
+        "PARTITION_NAME": partition["name"],
+        "RAW_SHARDS": ",".join(partition["shards"]),
+        "PARTITION_MIN_ID": "" if partition["min_id"] is None else str(partition["min_id"]),
+        "PARTITION_MAX_ID": "" if partition["max_id"] is None else str(partition["max_id"]),
+        "SUMMARY_PARTITION": partition["name"],
+    }
+    run_python(script, env, partition["name"])
+
+@dag(
+    'datalake_pipeline',
+    default_args=default_args,
+    description='Pipeline d’intégration du Data Lake : ingestion, puis raw->staging et staging->curated par partition',
+    schedule='@daily',  # Vous pouvez changer la fréquence ou mettre None pour une exécution manuelle
+    catchup=False,
+    max_active_tasks=PIPELINE_PARTITIONS * 2
 )
+def datalake_pipeline():
+    # Tâche 1 : Ingestion des données (couche Raw)
+    ingest_task = BashOperator(
+        task_id='ingest_data',
+        bash_command=f'"{sys.executable}" "{project_path}/scripts/ingestion.py"'
+    )
+
+    # Tâche 2 : Création / migration des schémas Staging (MySQL) et Curated (index MongoDB, cache de sentiment),
+    # une seule fois : les partitions, lancées en parallèle, ne font ensuite que les vérifier
+    @task
+    def setup_schemas():
+        env = {**os.environ, "SCHEMA_SETUP_ONLY": "1"}
+        run_python("transform_raw_to_staging.py", env, "schéma")
+        run_python("transform_staging_to_curated.py", env, "schéma")
+
+    # Tâche 3 : Découpage des shards raw en partitions contiguës, équilibrées en nombre d'enregistrements
+    @task
+    def plan_partitions():
+        sys.path.insert(0, f"{project_path}/scripts")
+        from partitions import fetch_raw_manifest, plan_partitions as plan
+        partitions = plan(fetch_raw_manifest(), PIPELINE_PARTITIONS)
+        print(f"{len(partitions)} partition(s) : " + ", ".join(p["name"] for p in partitions))
+        return partitions
+
+    # Tâche 4 (une instance par partition) : Raw -> Staging puis Staging -> Curated ;
+    # une partition peut passer en Curated pendant que les autres sont encore en Staging
+    @task_group
+    def process_partition(partition):
+        @task
+        def transform_raw_to_staging(partition):
+            run_script("transform_raw_to_staging.py", partition)
+            return partition
+
+        @task
+        def transform_staging_to_curated(partition):
+            run_script("transform_staging_to_curated.py", partition)
+
+        return transform_staging_to_curated(transform_raw_to_staging(partition))
+
+    # Tâche 5 : Suppression des agrégats de partitions obsolètes et recalcul de la vue globale
+    @task
+    def finalize_summaries(partitions):
+        sys.path.insert(0, f"{project_path}/scripts")
+        from partitions import finalize_summaries as finalize
+        finalize([p["name"] for p in partitions])
+
+    # Tâche 6 : Invalidation du cache de statistiques de l'API ; un échec (API arrêtée ou injoignable) est
+    # signalé par un avertissement dans le journal de la tâche, sans faire échouer le pipeline
+    @task
+    def invalidate_api_stats_cache():
+        import requests
+
+        url = f"{api_url}/stats/invalidate"
+        try:
+            response = requests.post(url, timeout=10)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            log.warning("Cache de statistiques de l'API non invalidé (%s) : %s", url, e)
+            return
+        print(f"Cache de statistiques de l'API invalidé ({url}).")
+
+    # Définir l'ordre d'exécution des tâches
+    partitions = plan_partitions()
+    ingest_task >> setup_schemas() >> partitions
+    processed = process_partition.expand(partition=partitions)
+    processed >> finalize_summaries(partitions) >> invalidate_api_stats_cache()
 
-# Définir l'ordre d'exécution des tâches
-ingest_task >> transform_raw_task >> transform_staging_task
+datalake_pipeline()
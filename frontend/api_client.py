@@ -0,0 +1,106 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+
+class ApiError(Exception):
+    """Échec d'un appel à l'API : connexion impossible, délai dépassé ou code HTTP d'erreur."""
+
+def parse_cache_control(value):
+    """Découpe un en-tête Cache-Control : "private, max-age=10" -> {"private": None, "max-age": "10"}."""
+    directives = {}
+    for part in value.split(","):
+        name, _, argument = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip('"') or None
+    return directives
+
+class ApiClient:
+    """
+    Client HTTP du dashboard pour l'API Flask :
+    - une seule session requests, dont les connexions HTTP restent ouvertes d'un appel à l'autre ;
+    - un cache des réponses qui suit leur en-tête Cache-Control : une réponse encore fraîche (max-age)
+      est servie sans requête ; une réponse expirée est revalidée par une requête conditionnelle
+      (If-None-Match), à laquelle l'API répond 304 sans corps si les données n'ont pas changé ;
+      no-store n'est jamais mis en cache. Sans Cache-Control, une réponse reste fraîche default_ttl secondes ;
+    - fetch_many interroge plusieurs endpoints en parallèle.
+    Le client est partagé par toutes les sessions Streamlit (st.cache_resource) : il est thread-safe.
+    """
+
+    def __init__(self, base_url, timeout=10, pool_size=8, default_ttl=30):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.default_ttl = default_ttl
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=pool_size)
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._counters = {"fresh": 0, "revalidated": 0, "fetched": 0}
+
+    def get(self, path):
+        """Retourne le JSON de l'endpoint path (ex. "/stats/"), depuis le cache si possible ; lève ApiError en cas d'échec."""
+        with self._lock:
+            entry = self._entries.get(path)
+        if entry is not None and entry["expires_at"] > time.monotonic():
+            self._count("fresh")
+            return entry["data"]
+
+        headers = {"If-None-Match": entry["etag"]} if entry is not None and entry["etag"] else {}
+        try:
+            response = self.session.get(self.base_url + path, headers=headers, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise ApiError(f"Erreur de connexion à {path} : {e}") from e
+        if response.status_code == 304 and entry is not None:
+            data = entry["data"]
+            self._count("revalidated")
+        elif response.status_code == 200:
+            try:
+                data = response.json()
+            except ValueError as e:
+                raise ApiError(f"Réponse invalide sur {path} : {e}") from e
+            self._count("fetched")
+        else:
+            raise ApiError(f"Erreur {response.status_code} sur {path}")
+        self._store(path, response, data, response.headers.get("ETag") or (entry or {}).get("etag"))
+        return data
+
+    def fetch_many(self, paths):
+        """Interroge les endpoints en parallèle ; retourne {path: données JSON ou ApiError}."""
+        futures = {path: self._executor.submit(self.get, path) for path in dict.fromkeys(paths)}
+        results = {}
+        for path, future in futures.items():
+            try:
+                results[path] = future.result()
+            except ApiError as e:
+                results[path] = e
+        return results
+
+    def _store(self, path, response, data, etag):
+        directives = parse_cache_control(response.headers.get("Cache-Control", ""))
+        if "no-store" in directives:
+            with self._lock:
+                self._entries.pop(path, None)
+            return
+        ttl = self.default_ttl
+        if "no-cache" in directives:
+            ttl = 0
+        elif directives.get("max-age"):
+            try:
+                ttl = int(directives["max-age"])
+            except ValueError:
+                pass
+        with self._lock:
+            self._entries[path] = {"data": data, "etag": etag, "expires_at": time.monotonic() + ttl}
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def stats(self):
+        """Compteurs du cache : réponses servies sans requête, revalidées (304) et téléchargées."""
+        with self._lock:
+            return {**self._counters, "entries": len(self._entries)}
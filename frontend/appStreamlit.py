@@ -1,7 +1,8 @@
+import os
 import streamlit as st
-import requests
 import pandas as pd
 import altair as alt
+from api_client import ApiClient
 
 st.set_page_config(page_title="Dashboard Data Lake & Airflow", layout="wide")
 
@@ -17,25 +18,40 @@ page = st.sidebar.radio("Navigation", (
     "Santé"
 ))
 
-api_base = "http://localhost:5000"  # Assurez-vous que votre API Flask écoute sur ce port
+api_base = os.getenv("API_BASE_URL", "http://localhost:5000")  # Assurez-vous que votre API Flask écoute sur ce port
+# Durée de fraîcheur des réponses de l'API qui n'indiquent pas leur propre Cache-Control
+DASHBOARD_CACHE_TTL = int(os.getenv("DASHBOARD_CACHE_TTL", 30))
 
-@st.cache_data(show_spinner=False)
-def fetch_api(endpoint):
+@st.cache_resource
+def get_client():
+    """Client HTTP partagé par toutes les sessions : connexions persistantes et cache des réponses (voir api_client.py)."""
+    return ApiClient(api_base, default_ttl=DASHBOARD_CACHE_TTL)
+
+def fetch_all(*paths):
+    """Interroge les endpoints de l'API en parallèle ; un endpoint en erreur est signalé et vaut None."""
+    results = get_client().fetch_many(paths)
+    for path, result in results.items():
+        if isinstance(result, Exception):
+            st.error(str(result))
+            results[path] = None
+    return results
+
+def fetch_api(path):
     """Fonction pour interroger l'API et récupérer les données en JSON."""
-    try:
-        response = requests.get(endpoint)
-        if response.status_code == 200:
-            return response.json()
-        else:
-            st.error(f"Erreur {response.status_code} sur {endpoint}")
-    except Exception as e:
-        st.error(f"Erreur de connexion à {endpoint} : {e}")
-    return None
+    return fetch_all(path)[path]
 
 if page == "Accueil":
     st.header("Vue d'ensemble")
-    stats = fetch_api(f"{api_base}/stats")
+    # Santé et statistiques sont interrogées en même temps ; les volumes viennent uniquement de /stats/
+    # (estimations lues dans les métadonnées des bases, sans comptage complet des tables)
+    results = fetch_all("/stats/", "/health/")
+    health = results["/health/"]
+    stats = results["/stats/"]
+    col_health, col_staging, col_curated = st.columns(3)
+    col_health.metric("API", health.get("status", "?") if health else "Indisponible")
     if stats:
+        col_staging.metric("Critiques Staging", stats.get("staging_records_count", "?"))
+        col_curated.metric("Critiques Curated", stats.get("curated_records_count", "?"))
         df_stats = pd.DataFrame(list(stats.items()), columns=["Métrique", "Valeur"])
         st.table(df_stats)
         chart = alt.Chart(df_stats).mark_bar().encode(
@@ -46,26 +62,26 @@ if page == "Accueil":
 
 elif page == "Données Raw":
     st.header("Données Raw")
-    raw_data = fetch_api(f"{api_base}/raw")
+    raw_data = fetch_api("/raw/")
     if raw_data:
         preview = raw_data.get("raw_data_preview", "Aucun aperçu disponible.")
         st.text_area("Aperçu des données Raw", preview, height=300)
 
 elif page == "Données Staging":
     st.header("Données Staging")
-    staging_data = fetch_api(f"{api_base}/staging")
+    staging_data = fetch_api("/staging/")
     if staging_data:
         st.write(staging_data)
 
 elif page == "Données Curated":
     st.header("Données Curated")
-    curated_data = fetch_api(f"{api_base}/curated")
+    curated_data = fetch_api("/curated/")
     if curated_data:
         st.write(curated_data)
 
 elif page == "Statistiques":
     st.header("Statistiques")
-    stats = fetch_api(f"{api_base}/stats")
+    stats = fetch_api("/stats/")
     if stats:
         df_stats = pd.DataFrame(list(stats.items()), columns=["Métrique", "Valeur"])
         st.table(df_stats)
@@ -73,6 +89,8 @@ elif page == "Statistiques":
 
 elif page == "Santé":
     st.header("État de Santé de l'API")
-    health = fetch_api(f"{api_base}/health")
+    health = fetch_api("/health/")
     if health:
         st.json(health)
+    st.subheader("Cache du dashboard")
+    st.json(get_client().stats())
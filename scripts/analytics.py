@@ -0,0 +1,166 @@
+import math
+from collections import Counter
+
+SCORE_BINS = 20  # Histogramme du score compound sur [-1, 1]
+QUANTILES = (0.25, 0.5, 0.75, 0.9, 0.99)
+
+class LengthSketch:
+    """
+    Sketch de quantiles fusionnable (buckets logarithmiques, précision relative bornée, à la DDSketch).
+    Deux sketches calculés sur des partitions différentes se fusionnent en additionnant leurs buckets.
+    """
+
+    def __init__(self, relative_accuracy=0.01, buckets=None, zero_count=0, count=0, total=0, minimum=None, maximum=None):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets = Counter({int(index): n for index, n in (buckets or {}).items()})
+        self.zero_count = zero_count
+        self.count = count
+        self.total = total
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def add(self, value):
+        if value is None:
+            return
+        if value <= 0:
+            self.zero_count += 1
+        else:
+            self.buckets[math.ceil(math.log(value) / self.log_gamma)] += 1
+        self.count += 1
+        self.total += value
+        self.minimum = value if self.minimum is None else min(self.minimum, value)
+        self.maximum = value if self.maximum is None else max(self.maximum, value)
+
+    def merge(self, other):
+        self.buckets.update(other.buckets)
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.total += other.total
+        for bound in (other.minimum, other.maximum):
+            if bound is not None:
+                self.minimum = bound if self.minimum is None else min(self.minimum, bound)
+                self.maximum = bound if self.maximum is None else max(self.maximum, bound)
+
+    def quantile(self, q):
+        """Valeur approchée du quantile q (erreur relative <= relative_accuracy)."""
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        cumulative = self.zero_count
+        if rank < cumulative:
+            return 0
+        for index in sorted(self.buckets):
+            cumulative += self.buckets[index]
+            if rank < cumulative:
+                value = 2 * self.gamma ** index / (self.gamma + 1)
+                return min(max(round(value), self.minimum), self.maximum)
+        return self.maximum
+
+    def to_dict(self):
+        # Les clés des documents MongoDB doivent être des chaînes
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "buckets": {str(index): n for index, n in self.buckets.items()},
+            "zero_count": self.zero_count,
+            "count": self.count,
+            "total": self.total,
+            "min": self.minimum,
+            "max": self.maximum,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data["relative_accuracy"], data["buckets"], data["zero_count"],
+            data["count"], data["total"], data["min"], data["max"]
+        )
+
+    def summary(self):
+        """Statistiques prêtes à être affichées : moyenne, min, max et quantiles."""
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 2) if self.count else None,
+            "min": self.minimum,
+            "max": self.maximum,
+            "quantiles": {f"p{round(q * 100)}": self.quantile(q) for q in QUANTILES},
+        }
+
+class CuratedSummary:
+    """
+    Agrégats de la couche Curated calculés pendant l'enrichissement : nombre de documents par sentiment,
+    histogramme des scores et sketches de longueur (word_count, char_count). Fusionnable entre partitions.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.sentiment_counts = Counter()
+        self.score_histogram = [0] * SCORE_BINS
+        self.word_count = LengthSketch()
+        self.char_count = LengthSketch()
+
+    def add(self, document):
+        self.count += 1
+        self.sentiment_counts[document["sentiment"]] += 1
+        score = document["sentiment_score"]
+        if score is not None:
+            self.score_histogram[min(int((score + 1) / 2 * SCORE_BINS), SCORE_BINS - 1)] += 1
+        self.word_count.add(document["word_count"])
+        self.char_count.add(document["char_count"])
+
+    def track(self, documents):
+        """Met à jour les agrégats au passage d'un flux de documents, sans le matérialiser."""
+        for document in documents:
+            self.add(document)
+            yield document
+
+    def merge(self, other):
+        self.count += other.count
+        self.sentiment_counts.update(other.sentiment_counts)
+        self.score_histogram = [a + b for a, b in zip(self.score_histogram, other.score_histogram)]
+        self.word_count.merge(other.word_count)
+        self.char_count.merge(other.char_count)
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sentiment_counts": dict(self.sentiment_counts),
+            "score_histogram": self.score_histogram,
+            "word_count_sketch": self.word_count.to_dict(),
+            "char_count_sketch": self.char_count.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        summary = cls()
+        summary.count = data["count"]
+        summary.sentiment_counts = Counter(data["sentiment_counts"])
+        summary.score_histogram = list(data["score_histogram"])
+        summary.word_count = LengthSketch.from_dict(data["word_count_sketch"])
+        summary.char_count = LengthSketch.from_dict(data["char_count_sketch"])
+        return summary
+
+    @classmethod
+    def merge_all(cls, documents):
+        """Fusionne des agrégats sérialisés (documents de partition) ; retourne (agrégat fusionné, nombre de partitions)."""
+        merged = cls()
+        partitions = 0
+        for document in documents:
+            merged.merge(cls.from_dict(document))
+            partitions += 1
+        return merged, partitions
+
+    def analytics(self):
+        """Vue consolidée lue telle quelle par l'API."""
+        width = 2 / SCORE_BINS
+        return {
+            "count": self.count,
+            "sentiment_counts": dict(self.sentiment_counts),
+            "score_histogram": [
+                {"from": round(-1 + i * width, 2), "to": round(-1 + (i + 1) * width, 2), "count": n}
+                for i, n in enumerate(self.score_histogram)
+            ],
+            "word_count": self.word_count.summary(),
+            "char_count": self.char_count.summary(),
+        }
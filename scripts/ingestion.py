@@ -1,38 +1,269 @@
 import os
 import json
+import gzip
+import hashlib
+import tempfile
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
 import boto3
-from datasets import load_dataset
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import ClientError
 from dotenv import load_dotenv
+from instrumentation import Metrics, run
 
 # Charger les variables d'environnement depuis le fichier .env
 load_dotenv()
 
 AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
 AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
-AWS_REGION = os.getenv("AWS_REGION", "eu-west-3")  
+AWS_REGION = os.getenv("AWS_REGION", "eu-west-3")
 S3_BUCKET = os.getenv("S3_BUCKET")
 
-def upload_to_s3(bucket, key, content):
-    # Création d'un client S3 avec les clés depuis les variables d'environnement
-    s3 = boto3.client(
+# Mode d'ingestion : "sharded" (shards + manifeste) ou "single" (ancien fichier unique)
+INGESTION_MODE = os.getenv("INGESTION_MODE", "sharded")
+# Format des shards : "jsonl" (JSON Lines) ou "arrow" (Arrow IPC colonnaire, lu en mémoire mappée, voir raw_arrow.py)
+SHARD_FORMAT = os.getenv("SHARD_FORMAT", "jsonl")
+RAW_KEY = "imdb_raw.json"  # Clé utilisée par le mode "single"
+RAW_PREFIX = os.getenv("RAW_PREFIX", "imdb_raw")  # Préfixe S3 des shards
+MANIFEST_KEY = f"{RAW_PREFIX}/manifest.json"
+
+# Paramètres des shards et des transferts
+SHARD_MAX_BYTES = int(os.getenv("SHARD_MAX_BYTES", 64 * 1024 * 1024))  # Taille max (non compressée) d'un shard
+# JSON Lines : "gzip" ou "none" ; Arrow : "none" (lecture sans copie), "zstd" ou "lz4"
+SHARD_COMPRESSION = os.getenv("SHARD_COMPRESSION", "gzip" if SHARD_FORMAT == "jsonl" else "none")
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", 4))  # Nombre de shards envoyés en parallèle
+UPLOAD_PART_CONCURRENCY = int(os.getenv("UPLOAD_PART_CONCURRENCY", 2))  # Parties multipart envoyées en parallèle par shard
+MULTIPART_CHUNK_SIZE = int(os.getenv("MULTIPART_CHUNK_SIZE", 8 * 1024 * 1024))
+
+metrics = Metrics("ingestion")
+
+def get_s3_client(max_pool_connections=10):
+    """
+    Crée un client S3 avec les clés depuis les variables d'environnement. max_pool_connections
+    (10 par défaut dans botocore) borne les requêtes simultanées que le client peut servir sans attente.
+    """
+    return boto3.client(
         's3',
         aws_access_key_id=AWS_ACCESS_KEY_ID,
         aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-        region_name=AWS_REGION
+        region_name=AWS_REGION,
+        config=Config(max_pool_connections=max_pool_connections)
     )
+
+def upload_to_s3(bucket, key, content):
+    # Création d'un client S3 avec les clés depuis les variables d'environnement
+    s3 = get_s3_client()
     # Envoi du contenu vers S3
     s3.put_object(Bucket=bucket, Key=key, Body=content)
     print(f"Fichier envoyé sur S3 dans le bucket '{bucket}' sous la clé '{key}'.")
 
+def iter_records(split):
+    """Parcourt la partition ligne par ligne (sans la matérialiser) en attribuant un id stable à chaque critique."""
+    for idx, row in enumerate(split):
+        yield {"id": idx, "text": row["text"], "label": row["label"]}
+
+def file_sha256(path):
+    """Calcule l'empreinte SHA-256 d'un fichier par blocs."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class ShardWriter:
+    """
+    Écrit des enregistrements en JSON Lines compact dans des fichiers temporaires
+    dont la taille (non compressée) est bornée par max_bytes.
+    Chaque shard fermé est transmis au callback on_shard_closed.
+    """
+
+    def __init__(self, prefix, max_bytes, compression, on_shard_closed):
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.compression = compression
+        self.on_shard_closed = on_shard_closed
+        self.shard_index = 0
+        self._file = None
+        self._raw_file = None
+        self._path = None
+        self._bytes = 0
+        self._records = 0
+        self._first_id = None
+        self._last_id = None
+
+    def _extension(self):
+        return ".jsonl.gz" if self.compression == "gzip" else ".jsonl"
+
+    def _open(self):
+        fd, self._path = tempfile.mkstemp(suffix=self._extension())
+        os.close(fd)
+        self._raw_file = open(self._path, "wb")
+        if self.compression == "gzip":
+            # mtime=0 : un même contenu produit toujours les mêmes octets (et donc la même empreinte)
+            self._file = gzip.GzipFile(filename="", mode="wb", compresslevel=6, fileobj=self._raw_file, mtime=0)
+        else:
+            self._file = self._raw_file
+        self._bytes = 0
+        self._records = 0
+        self._first_id = None
+
+    def _encode(self, record):
+        """Retourne (données à écrire, taille non compressée) pour un enregistrement."""
+        line = (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        return line, len(line)
+
+    def write(self, record):
+        payload, size = self._encode(record)
+        if self._file is not None and self._bytes + size > self.max_bytes:
+            self.close_shard()
+        if self._file is None:
+            self._open()
+        self._file.write(payload)
+        self._bytes += size
+        self._records += 1
+        if self._first_id is None:
+            self._first_id = record["id"]
+        self._last_id = record["id"]
+
+    def close_shard(self):
+        if self._file is None:
+            return
+        self._file.close()
+        if self._raw_file is not None:
+            self._raw_file.close()
+        shard = {
+            "key": f"{self.prefix}/part-{self.shard_index:05d}{self._extension()}",
+            "path": self._path,
+            "records": self._records,
+            "first_id": self._first_id,
+            "last_id": self._last_id,
+            "uncompressed_bytes": self._bytes,
+            "bytes": os.path.getsize(self._path),
+            "sha256": file_sha256(self._path),
+        }
+        self._file = None
+        self.shard_index += 1
+        metrics.count("bytes", self._bytes, direction="serialized")
+        self.on_shard_closed(shard)
+
+class ArrowShardWriter(ShardWriter):
+    """
+    Variante de ShardWriter produisant des shards Arrow IPC (colonnes id, text, label).
+    La taille non compressée d'un enregistrement est estimée d'après la longueur de son texte.
+    """
+
+    def _extension(self):
+        return ".arrow"
+
+    def _open(self):
+        from raw_arrow import ArrowShardFile
+
+        fd, self._path = tempfile.mkstemp(suffix=self._extension())
+        os.close(fd)
+        self._file = ArrowShardFile(self._path, self.compression)
+        self._raw_file = None
+        self._bytes = 0
+        self._records = 0
+        self._first_id = None
+
+    def _encode(self, record):
+        return record, len(record["text"]) + 16
+
+def upload_shard(s3, bucket, shard, transfer_config):
+    """
+    Envoie un shard sur S3 en multipart (géré par boto3) puis supprime le fichier temporaire.
+    Si un objet de même empreinte existe déjà sous cette clé, l'envoi est ignoré.
+    """
+    try:
+        try:
+            head = s3.head_object(Bucket=bucket, Key=shard["key"])
+            if head.get("Metadata", {}).get("sha256") == shard["sha256"]:
+                print(f"Shard '{shard['key']}' déjà présent et identique, envoi ignoré.")
+                return shard
+        except ClientError:
+            pass
+        with metrics.timer("upload"):
+            s3.upload_file(
+                shard["path"], bucket, shard["key"],
+                ExtraArgs={"Metadata": {"sha256": shard["sha256"]}},
+                Config=transfer_config
+            )
+        metrics.count("bytes", shard["bytes"], direction="upload")
+        print(f"Shard '{shard['key']}' envoyé ({shard['records']} enregistrements, {shard['bytes']} octets).")
+        return shard
+    finally:
+        os.remove(shard["path"])
+
+def ingest_sharded(bucket, records):
+    """
+    Découpe le flux d'enregistrements en shards (JSON Lines ou Arrow IPC), les envoie en parallèle sur S3
+    puis publie le manifeste. La mémoire reste bornée par la taille d'un shard.
+    """
+    # UPLOAD_CONCURRENCY shards envoyés chacun en UPLOAD_PART_CONCURRENCY parties simultanées, par un seul client :
+    # son pool de connexions doit couvrir toutes ces requêtes
+    s3 = get_s3_client(max_pool_connections=max(10, UPLOAD_CONCURRENCY * UPLOAD_PART_CONCURRENCY))
+    transfer_config = TransferConfig(
+        multipart_threshold=MULTIPART_CHUNK_SIZE,
+        multipart_chunksize=MULTIPART_CHUNK_SIZE,
+        max_concurrency=UPLOAD_PART_CONCURRENCY
+    )
+    pending = []
+    done = []
+
+    with ThreadPoolExecutor(max_workers=UPLOAD_CONCURRENCY) as executor:
+        def on_shard_closed(shard):
+            # On limite le nombre de shards en attente pour ne pas saturer le disque temporaire
+            if len(pending) >= UPLOAD_CONCURRENCY * 2:
+                done.append(pending.pop(0).result())
+            pending.append(executor.submit(upload_shard, s3, bucket, shard, transfer_config))
+
+        writer_class = ArrowShardWriter if SHARD_FORMAT == "arrow" else ShardWriter
+        writer = writer_class(RAW_PREFIX, SHARD_MAX_BYTES, SHARD_COMPRESSION, on_shard_closed)
+        serialize = metrics.stopwatch("serialize")
+        for record in records:
+            with serialize:
+                writer.write(record)
+        writer.close_shard()
+        serialize.publish()
+        done.extend(future.result() for future in pending)
+
+    shards = [{k: v for k, v in shard.items() if k != "path"} for shard in done]
+    manifest = {
+        "version": 1,
+        "dataset": "imdb",
+        "split": "train",
+        "format": SHARD_FORMAT,
+        "compression": SHARD_COMPRESSION,
+        "record_count": sum(shard["records"] for shard in shards),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "shards": shards,
+    }
+    # Le manifeste est publié en dernier : les lecteurs ne voient que des jeux de shards complets
+    s3.put_object(
+        Bucket=bucket,
+        Key=MANIFEST_KEY,
+        Body=json.dumps(manifest, indent=2).encode("utf-8"),
+        ContentType="application/json"
+    )
+    print(f"Manifeste '{MANIFEST_KEY}' publié : {len(shards)} shards, {manifest['record_count']} enregistrements.")
+    return manifest
+
 if __name__ == "__main__":
-    print("Téléchargement du dataset IMDB...")
-    # Télécharger le dataset IMDB depuis Hugging Face
-    dataset = load_dataset("imdb")
-    # On récupère par exemple la partition 'train'
-    data_train = dataset["train"][:]
-    json_data = json.dumps(data_train, ensure_ascii=False, indent=2)
-    
-    key_name = "imdb_raw.json"
-    upload_to_s3(S3_BUCKET, key_name, json_data)
-    
-    print("Le dataset IMDB a été ingéré et stocké dans la couche Raw (S3).")
+    with run(metrics):
+        print("Téléchargement du dataset IMDB...")
+        # Télécharger le dataset IMDB depuis Hugging Face (datasets est long à importer : importé ici seulement)
+        with metrics.timer("download"):
+            from datasets import load_dataset
+            dataset = load_dataset("imdb")
+
+        if INGESTION_MODE == "single":
+            # Ancien mode : un unique fichier JSON contenant toute la partition 'train'
+            data_train = dataset["train"][:]
+            json_data = json.dumps(data_train, ensure_ascii=False, indent=2)
+            with metrics.timer("upload"):
+                upload_to_s3(S3_BUCKET, RAW_KEY, json_data)
+        else:
+            ingest_sharded(S3_BUCKET, iter_records(dataset["train"]))
+
+        print("Le dataset IMDB a été ingéré et stocké dans la couche Raw (S3).")
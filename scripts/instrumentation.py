@@ -0,0 +1,277 @@
+"""
+Instrumentation partagée par les scripts du pipeline et l'API : compteurs, durées par phase
+(histogrammes de latence par lot), logs structurés et export au format texte Prometheus.
+
+Variables d'environnement :
+- LOG_FORMAT : "text" (défaut) ou "json" pour des logs structurés (une ligne JSON par événement)
+- METRICS_DIR : dossier où chaque script écrit ses métriques en fin d'exécution (<étape>.json),
+  relues par l'endpoint /metrics de l'API ; vide = désactivé
+- PROFILE_DIR : dossier où enregistrer un profil cProfile par exécution (<étape>-<horodatage>.prof) ; vide = désactivé
+"""
+import cProfile
+import glob
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "")
+
+METRIC_PREFIX = "datalake"
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_IMPORTED_AT = time.perf_counter()
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+class Histogram:
+    """Histogramme cumulatif de durées (secondes), au sens de Prometheus."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS, counts=None, count=0, total=0.0, maximum=0.0):
+        self.buckets = tuple(buckets)
+        self.counts = list(counts) if counts else [0] * len(self.buckets)
+        self.count = count
+        self.total = total
+        self.maximum = maximum
+
+    def observe(self, seconds):
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[i] += 1
+        self.count += 1
+        self.total += seconds
+        self.maximum = max(self.maximum, seconds)
+
+    def to_dict(self):
+        return {"buckets": self.buckets, "counts": self.counts, "count": self.count, "sum": self.total, "max": self.maximum}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["buckets"], data["counts"], data["count"], data["sum"], data["max"])
+
+class Stopwatch:
+    """
+    Accumule la durée de nombreux passages très courts (une ligne JSON, un token) sans verrou ;
+    le total est publié en une seule observation par publish().
+    """
+
+    def __init__(self, registry, phase):
+        self.registry = registry
+        self.phase = phase
+        self.seconds = 0.0
+        self.count = 0
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.seconds += time.perf_counter() - self._start
+        self.count += 1
+
+    def publish(self):
+        if self.count:
+            self.registry.observe(self.phase, self.seconds)
+            self.registry.count("records", self.count, phase=self.phase)
+        self.seconds, self.count = 0.0, 0
+
+class Metrics:
+    """
+    Registre de métriques d'un processus (une étape du pipeline ou l'API), utilisable depuis plusieurs threads :
+    - count(name, value, **labels) -> compteur <prefix>_<name>_total
+    - observe(phase, seconds) / timer(phase) -> histogramme <prefix>_phase_seconds{phase=...}
+    - gauge(name, value, **labels) -> jauge <prefix>_<name>
+    """
+
+    def __init__(self, stage):
+        self.stage = stage
+        self._lock = threading.Lock()
+        self.counters = defaultdict(int)
+        self.gauges = {}
+        self.histograms = {}
+
+    def count(self, name, value=1, **labels):
+        with self._lock:
+            self.counters[(name, _label_key(labels))] += value
+
+    def gauge(self, name, value, **labels):
+        with self._lock:
+            self.gauges[(name, _label_key(labels))] = value
+
+    def observe(self, phase, seconds, name="phase_seconds", **labels):
+        key = (name, _label_key({"phase": phase, **labels}))
+        with self._lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(seconds)
+
+    @contextmanager
+    def timer(self, phase, **labels):
+        """Mesure la durée du bloc (un lot, une requête) dans l'histogramme de la phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(phase, time.perf_counter() - start, **labels)
+
+    def stopwatch(self, phase):
+        return Stopwatch(self, phase)
+
+    def log(self, event, **fields):
+        """Log structuré : une ligne JSON si LOG_FORMAT=json, sinon une ligne clé=valeur lisible."""
+        if LOG_FORMAT == "json":
+            print(json.dumps({
+                "ts": datetime.now(timezone.utc).isoformat(),
+                "stage": self.stage,
+                "event": event,
+                **fields
+            }, ensure_ascii=False, default=str), flush=True)
+        else:
+            print(f"[{self.stage}] {event} " + " ".join(f"{key}={value}" for key, value in fields.items()), flush=True)
+
+    def phases(self):
+        """Résumé des phases : nombre de lots, durée totale, durée moyenne et maximale."""
+        with self._lock:
+            return {
+                dict(labels)["phase"]: {
+                    "batches": histogram.count,
+                    "seconds": round(histogram.total, 4),
+                    "mean_seconds": round(histogram.total / histogram.count, 6) if histogram.count else 0.0,
+                    "max_seconds": round(histogram.maximum, 4),
+                }
+                for (name, labels), histogram in self.histograms.items() if name == "phase_seconds"
+            }
+
+    def totals(self):
+        """Valeurs des compteurs, indexées par nom et labels (ex. "records{phase=parse}")."""
+        with self._lock:
+            return {
+                name + ("{" + ",".join(f"{key}={value}" for key, value in labels) + "}" if labels else ""): value
+                for (name, labels), value in self.counters.items()
+            }
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "stage": self.stage,
+                "counters": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in self.counters.items()],
+                "gauges": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in self.gauges.items()],
+                "histograms": [{"name": n, "labels": dict(l), **h.to_dict()} for (n, l), h in self.histograms.items()],
+            }
+
+    @classmethod
+    def from_dict(cls, data):
+        metrics = cls(data["stage"])
+        for item in data["counters"]:
+            metrics.counters[(item["name"], _label_key(item["labels"]))] = item["value"]
+        for item in data["gauges"]:
+            metrics.gauges[(item["name"], _label_key(item["labels"]))] = item["value"]
+        for item in data["histograms"]:
+            metrics.histograms[(item["name"], _label_key(item["labels"]))] = Histogram.from_dict(item)
+        return metrics
+
+    def save(self, directory=METRICS_DIR):
+        """Écrit les métriques dans <directory>/<étape>.json (remplacement atomique) ; sans effet si directory est vide."""
+        if not directory:
+            return
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.stage}.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(path + ".tmp", path)
+
+def load_saved_metrics(directory=METRICS_DIR):
+    """Relit les métriques écrites par les scripts du pipeline dans directory."""
+    registries = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))) if directory else []:
+        try:
+            with open(path, encoding="utf-8") as f:
+                registries.append(Metrics.from_dict(json.load(f)))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Métriques illisibles dans {path} :", e)
+    return registries
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in labels.values())
+    return "{" + ",".join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + "}"
+
+def render_prometheus(registries):
+    """Format texte Prometheus ; chaque famille de métriques est déclarée une seule fois pour tous les registres."""
+    families = defaultdict(list)
+    for registry in registries:
+        with registry._lock:
+            for (name, labels), value in registry.counters.items():
+                families[(f"{METRIC_PREFIX}_{name}_total", "counter")].append(
+                    f"{METRIC_PREFIX}_{name}_total{_format_labels({'stage': registry.stage, **dict(labels)})} {value}"
+                )
+            for (name, labels), value in registry.gauges.items():
+                families[(f"{METRIC_PREFIX}_{name}", "gauge")].append(
+                    f"{METRIC_PREFIX}_{name}{_format_labels({'stage': registry.stage, **dict(labels)})} {value}"
+                )
+            for (name, labels), histogram in registry.histograms.items():
+                family = f"{METRIC_PREFIX}_{name}"
+                labels = {"stage": registry.stage, **dict(labels)}
+                lines = families[(family, "histogram")]
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    lines.append(f"{family}_bucket{_format_labels({**labels, 'le': bound})} {count}")
+                lines.append(f"{family}_bucket{_format_labels({**labels, 'le': '+Inf'})} {histogram.count}")
+                lines.append(f"{family}_sum{_format_labels(labels)} {histogram.total}")
+                lines.append(f"{family}_count{_format_labels(labels)} {histogram.count}")
+    output = []
+    for (family, kind), lines in families.items():
+        output.append(f"# TYPE {family} {kind}")
+        output.extend(lines)
+    return "\n".join(output) + "\n"
+
+def process_uptime():
+    """
+    Secondes écoulées depuis le lancement du processus, démarrage de l'interpréteur et imports compris
+    (d'après /proc sous Linux ; ailleurs, depuis l'import de ce module).
+    """
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError, AttributeError):
+        return time.perf_counter() - _IMPORTED_AT
+
+@contextmanager
+def run(metrics):
+    """
+    Encadre l'exécution d'une étape du pipeline : temps de démarrage (lancement du processus -> début
+    du traitement), profilage cProfile optionnel (PROFILE_DIR), durée totale, puis résumé des phases
+    en log structuré et sauvegarde des métriques (METRICS_DIR).
+    """
+    startup = process_uptime()
+    metrics.gauge("startup_seconds", round(startup, 3))
+    metrics.log("startup", seconds=round(startup, 3))
+    profiler = None
+    if PROFILE_DIR:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    start = time.perf_counter()
+    try:
+        yield metrics
+    finally:
+        elapsed = time.perf_counter() - start
+        if profiler is not None:
+            profiler.disable()
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            path = os.path.join(PROFILE_DIR, f"{metrics.stage}-{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.prof")
+            profiler.dump_stats(path)
+            metrics.log("profile", path=path)
+        metrics.gauge("last_run_duration_seconds", round(elapsed, 3))
+        metrics.gauge("last_run_timestamp_seconds", round(time.time()))
+        metrics.log("summary", seconds=round(elapsed, 3), phases=metrics.phases(), counters=metrics.totals())
+        metrics.save()
@@ -0,0 +1,99 @@
+import os
+import json
+import tempfile
+from collections import OrderedDict
+
+class LemmaCache:
+    """
+    Cache token -> lemme borné par une éviction LRU.
+    Le coût de la lemmatisation devient proportionnel au vocabulaire distinct plutôt qu'au nombre de tokens.
+    Avec track_new_entries=True (processus workers), les entrées apprises depuis le dernier
+    drain_new_entries() sont conservées pour être renvoyées au processus principal, qui les fusionne
+    puis les persiste entre deux exécutions.
+    """
+
+    def __init__(self, lemmatize, max_size=100000, table=None, track_new_entries=False):
+        self._lemmatize = lemmatize
+        self.max_size = max_size
+        self.track_new_entries = track_new_entries
+        self._entries = OrderedDict()
+        self._new_entries = {}
+        self.hits = 0
+        self.misses = 0
+        if table:
+            self.update(table)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def lemmatize(self, token):
+        """Retourne le lemme du token, calculé une seule fois tant qu'il reste dans le cache."""
+        lemma = self._entries.get(token)
+        if lemma is not None:
+            self.hits += 1
+            self._entries.move_to_end(token)
+            return lemma
+        self.misses += 1
+        lemma = self._lemmatize(token)
+        self._store(token, lemma)
+        if self.track_new_entries:
+            self._new_entries[token] = lemma
+        return lemma
+
+    def _store(self, token, lemma):
+        self._entries[token] = lemma
+        self._entries.move_to_end(token)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def update(self, entries):
+        """Ajoute des entrées calculées ailleurs (table persistée ou autre worker)."""
+        for token, lemma in entries.items():
+            self._store(token, lemma)
+
+    def drain_new_entries(self):
+        """Retourne puis oublie les entrées apprises depuis le dernier appel."""
+        new_entries, self._new_entries = self._new_entries, {}
+        return new_entries
+
+    def drain_counters(self):
+        """Retourne (hits, misses) depuis le dernier appel puis remet les compteurs à zéro."""
+        counters = (self.hits, self.misses)
+        self.hits = self.misses = 0
+        return counters
+
+    def add_counters(self, hits, misses):
+        """Cumule les compteurs remontés par un worker."""
+        self.hits += hits
+        self.misses += misses
+
+    def table(self):
+        """Retourne le contenu du cache, du moins récemment utilisé au plus récent."""
+        return dict(self._entries)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+def load_lemma_table(path):
+    """Charge une table token -> lemme persistée, ou une table vide si le fichier n'existe pas."""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def save_lemma_table(path, table):
+    """Persiste la table token -> lemme de manière atomique (fichier temporaire puis renommage)."""
+    if not path:
+        return
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(table, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, path)
@@ -0,0 +1,80 @@
+"""
+Ressources NLTK du pipeline (WordNet pour la lemmatisation, lexique VADER pour le sentiment).
+NLTK, le lemmatizer et l'analyseur ne sont importés et construits qu'à la première utilisation :
+le lancement d'un script ou d'un processus worker ne paie pas leur chargement.
+
+Variables d'environnement :
+- NLTK_DATA : dossier(s) des ressources pré-installées, lu(s) par NLTK ; les téléchargements éventuels y sont écrits
+- NLTK_DOWNLOAD : "1" (défaut) télécharge une ressource absente ; "0" n'accède jamais au réseau et échoue
+  si une ressource manque (workers sans accès réseau)
+
+Pré-installation (sur une machine avec accès réseau) : NLTK_DATA=/chemin python scripts/nltk_resources.py
+"""
+import os
+
+# Paquet nltk.download -> chemin de la ressource installée (vérifié localement avec nltk.data.find)
+RESOURCES = {
+    "wordnet": "corpora/wordnet",
+    "omw-1.4": "corpora/omw-1.4",
+    "vader_lexicon": "sentiment/vader_lexicon.zip",
+}
+
+_verified = set()
+_lemmatizer = None
+_analyzer = None
+
+def ensure_resources(*packages):
+    """
+    Vérifie, sans accès réseau, que les ressources sont installées dans un dossier de NLTK_DATA
+    (ou un dossier par défaut de NLTK). Une ressource absente est téléchargée si NLTK_DOWNLOAD=1,
+    sinon une LookupError est levée. Chaque ressource n'est vérifiée qu'une fois par processus.
+    """
+    import nltk
+
+    for package in packages:
+        if package in _verified:
+            continue
+        try:
+            nltk.data.find(RESOURCES[package])
+        except LookupError:
+            # Lu à l'appel : les scripts chargent leur .env après l'import de ce module
+            if os.getenv("NLTK_DOWNLOAD", "1") != "1":
+                raise LookupError(
+                    f"Ressource NLTK '{package}' introuvable dans {nltk.data.path} (NLTK_DOWNLOAD=0) : "
+                    f"pré-installez-la avec NLTK_DATA=<dossier> python scripts/nltk_resources.py"
+                )
+            data_dirs = [path for path in os.getenv("NLTK_DATA", "").split(os.pathsep) if path]
+            if not nltk.download(package, download_dir=data_dirs[0] if data_dirs else None, quiet=True):
+                raise LookupError(f"Téléchargement de la ressource NLTK '{package}' impossible")
+        _verified.add(package)
+
+def get_lemmatizer():
+    """Lemmatizer WordNet du processus, créé au premier appel (WordNet est chargé à la première lemmatisation)."""
+    global _lemmatizer
+    if _lemmatizer is None:
+        ensure_resources("wordnet", "omw-1.4")
+        from nltk.stem import WordNetLemmatizer
+        _lemmatizer = WordNetLemmatizer()
+    return _lemmatizer
+
+def get_sentiment_analyzer():
+    """Analyseur VADER du processus, créé (chargement du lexique) au premier appel."""
+    global _analyzer
+    if _analyzer is None:
+        ensure_resources("vader_lexicon")
+        from nltk.sentiment import SentimentIntensityAnalyzer
+        _analyzer = SentimentIntensityAnalyzer()
+    return _analyzer
+
+def nltk_version():
+    import nltk
+    return nltk.__version__
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    ensure_resources(*RESOURCES)
+    import nltk
+    for package, resource in RESOURCES.items():
+        print(f"{package} : {nltk.data.find(resource)}")
@@ -0,0 +1,32 @@
+from collections import deque
+from itertools import islice
+
+def iter_chunks(iterable, chunk_size):
+    """Découpe un itérable en listes de chunk_size éléments au plus, sans le matérialiser."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+def ordered_map(executor, fn, chunks, max_in_flight):
+    """
+    Applique fn à chaque chunk via l'executor et renvoie les résultats dans l'ordre des chunks.
+    Au plus max_in_flight chunks sont soumis en même temps : la consommation de l'itérable
+    d'entrée suit le rythme des workers et la mémoire reste bornée.
+    """
+    in_flight = deque()
+    for chunk in chunks:
+        if len(in_flight) >= max_in_flight:
+            yield in_flight.popleft().result()
+        in_flight.append(executor.submit(fn, chunk))
+    while in_flight:
+        yield in_flight.popleft().result()
+
+def in_flight_limit(executor, per_worker=2):
+    """
+    Nombre de lots à garder en cours pour ordered_map : per_worker lots par worker, d'après le nombre de
+    workers avec lequel l'executor a réellement été créé (qui peut différer de la configuration par défaut).
+    """
+    return per_worker * executor._max_workers
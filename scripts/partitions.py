@@ -0,0 +1,93 @@
+"""
+Découpage du pipeline en partitions pour le DAG Airflow : chaque partition regroupe des shards raw
+consécutifs (donc une plage d'ids contiguë) et est traitée par sa propre tâche Raw -> Staging puis
+Staging -> Curated. Module volontairement léger (pas de NLTK) : il est importé par le DAG.
+"""
+import os
+import json
+import boto3
+from dotenv import load_dotenv
+
+load_dotenv()
+
+AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
+AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
+AWS_REGION = os.getenv("AWS_REGION", "eu-west-3")
+S3_BUCKET = os.getenv("S3_BUCKET")
+RAW_PREFIX = os.getenv("RAW_PREFIX", "imdb_raw")
+MANIFEST_KEY = f"{RAW_PREFIX}/manifest.json"
+
+MONGO_URI = os.getenv("MONGO_URI")
+MONGO_DB = os.getenv("MONGO_DB")
+
+def fetch_raw_manifest(bucket=S3_BUCKET):
+    """Manifeste des shards raw, ou None si la couche Raw est l'ancien fichier unique."""
+    s3 = boto3.client(
+        's3',
+        aws_access_key_id=AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+        region_name=AWS_REGION
+    )
+    try:
+        response = s3.get_object(Bucket=bucket, Key=MANIFEST_KEY)
+    except s3.exceptions.NoSuchKey:
+        return None
+    return json.loads(response['Body'].read())
+
+def plan_partitions(manifest, count):
+    """
+    Répartit les shards du manifeste en au plus count partitions de shards consécutifs, équilibrées
+    en nombre d'enregistrements. Chaque partition est un dictionnaire
+    {"name", "shards", "min_id", "max_id"} ; la première et la dernière ne sont pas bornées
+    (min_id / max_id à None) pour couvrir aussi les ids hors manifeste.
+    Sans manifeste, une seule partition "all" couvre toute la couche Raw.
+    """
+    if not manifest or not manifest["shards"]:
+        return [{"name": "all", "shards": [], "min_id": None, "max_id": None}]
+    shards = manifest["shards"]
+    count = max(1, min(count, len(shards)))
+    target = manifest["record_count"] / count
+    groups, current, records = [], [], 0
+    for index, shard in enumerate(shards):
+        current.append(shard)
+        records += shard["records"]
+        remaining_shards = len(shards) - index - 1
+        remaining_groups = count - len(groups) - 1
+        # On ferme la partition quand elle atteint sa part, en gardant au moins un shard par partition restante
+        if remaining_groups and (records >= target * (len(groups) + 1) or remaining_shards == remaining_groups):
+            groups.append(current)
+            current = []
+    groups.append(current)
+
+    partitions = []
+    for index, group in enumerate(groups):
+        partitions.append({
+            "name": f"p{index:03d}",
+            "shards": [shard["key"] for shard in group],
+            "min_id": group[0]["first_id"] if index > 0 else None,
+            "max_id": group[-1]["last_id"] if index < len(groups) - 1 else None,
+        })
+    return partitions
+
+def finalize_summaries(partition_names, mongo_uri=MONGO_URI, mongo_db=MONGO_DB):
+    """
+    Supprime les agrégats des partitions qui n'existent plus (exécution non partitionnée "all",
+    ancien découpage) puis recalcule le document "global" à partir des partitions courantes.
+    """
+    from pymongo import MongoClient
+    from analytics import CuratedSummary
+    from datetime import datetime, timezone
+
+    client = MongoClient(mongo_uri)
+    try:
+        summaries = client[mongo_db]["imdb_reviews_summary"]
+        removed = summaries.delete_many({"type": "partition", "partition": {"$nin": list(partition_names)}}).deleted_count
+        merged, partitions = CuratedSummary.merge_all(summaries.find({"type": "partition"}))
+        summaries.replace_one(
+            {"_id": "global"},
+            {"type": "global", "partitions": partitions, "updated_at": datetime.now(timezone.utc), **merged.analytics()},
+            upsert=True
+        )
+        print(f"Agrégats globaux recalculés à partir de {partitions} partition(s) ({removed} obsolète(s) supprimée(s)).")
+    finally:
+        client.close()
@@ -0,0 +1,79 @@
+"""
+Shards raw au format Arrow IPC (fichier), alternative binaire et colonnaire aux shards JSON Lines
+(SHARD_FORMAT=arrow) : colonnes id, text et label, découpées en record batches.
+Sans compression, les colonnes sont lues sur place (mémoire mappée, buffer ou plages d'un objet S3), sans copie ni décodage JSON ;
+avec SHARD_COMPRESSION=zstd ou lz4, les colonnes sont décompressées batch par batch à la lecture.
+"""
+import pyarrow as pa
+
+RAW_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("text", pa.string()),
+    ("label", pa.int64()),
+])
+
+# Métadonnée du schéma d'un shard : nombre d'enregistrements par record batch (tous pleins sauf le dernier)
+BATCH_ROWS_KEY = b"batch_rows"
+
+class ArrowShardFile:
+    """
+    Écrit un shard Arrow IPC dans path, par record batches de batch_rows enregistrements. La taille
+    des batches est notée dans le schéma (pied du fichier) : un lecteur peut aller directement au
+    batch contenant un enregistrement donné, sans lire ceux qui le précèdent.
+    """
+
+    def __init__(self, path, compression="none", batch_rows=1000):
+        self.batch_rows = batch_rows
+        options = pa.ipc.IpcWriteOptions(compression=None if compression == "none" else compression)
+        schema = RAW_SCHEMA.with_metadata({BATCH_ROWS_KEY: str(batch_rows)})
+        self._sink = pa.OSFile(path, "wb")
+        self._writer = pa.ipc.new_file(self._sink, schema, options=options)
+        self._columns = tuple([] for _ in RAW_SCHEMA)
+
+    def write(self, record):
+        for column, field in zip(self._columns, RAW_SCHEMA):
+            column.append(record[field.name])
+        if len(self._columns[0]) >= self.batch_rows:
+            self._flush()
+
+    def _flush(self):
+        if self._columns[0]:
+            self._writer.write_batch(pa.record_batch(list(self._columns), schema=RAW_SCHEMA))
+            self._columns = tuple([] for _ in RAW_SCHEMA)
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+        self._sink.close()
+
+def open_shard(source):
+    """
+    Ouvre un shard Arrow IPC : chemin d'un fichier local (mémoire mappée), contenu du shard (bytes, lu
+    sur place) ou fichier pyarrow déjà ouvert, par exemple S3FileSystem.open_input_file (lectures par plages).
+    """
+    if isinstance(source, str):
+        return pa.memory_map(source)
+    if isinstance(source, pa.NativeFile):
+        return source
+    return pa.BufferReader(source)
+
+def iter_shard_batches(source, start=0):
+    """
+    Parcourt un shard Arrow IPC (voir open_shard) à partir de l'enregistrement n° start. Chaque élément
+    est la liste des tuples (id, texte, label) d'un record batch. Seuls le pied du fichier et les batches
+    utiles sont lus : ceux qui précèdent start sont sautés d'après la taille notée dans le schéma
+    (les shards écrits sans cette métadonnée sont parcourus depuis le début).
+    """
+    with open_shard(source) as stream:
+        reader = pa.ipc.open_file(stream)
+        batch_rows = int((reader.schema.metadata or {}).get(BATCH_ROWS_KEY, 0))
+        first = min(start // batch_rows, reader.num_record_batches) if batch_rows else 0
+        position = first * batch_rows
+        for i in range(first, reader.num_record_batches):
+            batch = reader.get_batch(i)
+            offset = max(start - position, 0)
+            position += batch.num_rows
+            if offset >= batch.num_rows:
+                continue
+            batch = batch.slice(offset)
+            yield list(zip(*(batch.column(field.name).to_pylist() for field in RAW_SCHEMA)))
@@ -0,0 +1,95 @@
+import hashlib
+
+def text_hash(text):
+    """Empreinte SHA-1 d'un texte nettoyé, clé du cache de sentiment."""
+    return hashlib.sha1((text or "").encode("utf-8")).hexdigest()
+
+def analyzer_version(analyzer, library_version):
+    """
+    Version de l'analyseur : version de la bibliothèque + empreinte du lexique chargé.
+    Une mise à jour de NLTK ou du lexique VADER change la version et invalide donc le cache.
+    """
+    lexicon = "\n".join(f"{word}\t{score}" for word, score in sorted(analyzer.lexicon.items()))
+    return f"vader-{library_version}-{hashlib.sha1(lexicon.encode('utf-8')).hexdigest()[:12]}"
+
+class SentimentCache:
+    """
+    Cache persistant des scores de sentiment, stocké dans la base de staging (table sentiment_cache) :
+    (empreinte du cleaned_review, version de l'analyseur) -> score compound et catégorie.
+    """
+
+    def __init__(self, connection, version):
+        self.connection = connection
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+
+    def create_table(self):
+        """Crée la table si nécessaire et purge les entrées calculées par une autre version de l'analyseur."""
+        with self.connection.cursor() as cursor:
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS sentiment_cache (
+                text_hash CHAR(40) NOT NULL,
+                analyzer_version VARCHAR(64) NOT NULL,
+                sentiment_score DOUBLE,
+                sentiment VARCHAR(16),
+                PRIMARY KEY (text_hash, analyzer_version)
+            );
+            """)
+            cursor.execute("DELETE FROM sentiment_cache WHERE analyzer_version <> %s", (self.version,))
+            if cursor.rowcount:
+                print(f"{cursor.rowcount} entrées du cache de sentiment invalidées (changement d'analyseur).")
+        self.connection.commit()
+
+    def check_table(self):
+        """Vérifie que la table existe (exécution partitionnée : elle est créée avant le lancement des partitions)."""
+        with self.connection.cursor() as cursor:
+            cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.TABLES
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+            """, ("sentiment_cache",))
+            exists = cursor.fetchone()[0] > 0
+        if not exists:
+            raise RuntimeError(
+                "table sentiment_cache absente : exécutez d'abord SCHEMA_SETUP_ONLY=1 python scripts/transform_staging_to_curated.py"
+            )
+
+    def lookup(self, hashes):
+        """Retourne {text_hash: (sentiment_score, sentiment)} pour les empreintes déjà en cache."""
+        hashes = list(set(hashes))
+        if not hashes:
+            return {}
+        placeholders = ", ".join(["%s"] * len(hashes))
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT text_hash, sentiment_score, sentiment FROM sentiment_cache "
+                f"WHERE analyzer_version = %s AND text_hash IN ({placeholders})",
+                [self.version] + hashes
+            )
+            found = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+        self.hits += len(found)
+        self.misses += len(hashes) - len(found)
+        return found
+
+    def store(self, entries):
+        """Enregistre une liste de (text_hash, sentiment_score, sentiment) nouvellement calculés."""
+        if not entries:
+            return
+        with self.connection.cursor() as cursor:
+            cursor.executemany("""
+            INSERT INTO sentiment_cache (text_hash, analyzer_version, sentiment_score, sentiment)
+            VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                sentiment_score = VALUES(sentiment_score),
+                sentiment = VALUES(sentiment);
+            """, [(hash_, self.version, score, sentiment) for hash_, score, sentiment in entries])
+        self.connection.commit()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "version": self.version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
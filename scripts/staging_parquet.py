@@ -0,0 +1,212 @@
+"""
+Couche Staging au format Parquet (en complément ou à la place de la table MySQL imdb_reviews) :
+un fichier par source raw, découpé en row groups compressés, et une entrée de manifeste par fichier
+(_manifest/<nom>.json, écrite une fois le fichier complet) : plusieurs partitions peuvent ainsi être
+écrites en parallèle sans se marcher dessus. Emplacement local (dossier) ou S3 (s3://bucket/prefixe).
+"""
+import json
+import os
+import time
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from pyarrow import fs as pafs
+from instrumentation import Metrics
+
+MANIFEST_DIR = "_manifest"
+
+STAGING_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("original_review", pa.string()),
+    ("cleaned_review", pa.string()),
+    ("label", pa.int64()),
+    ("word_count", pa.int64()),
+    ("char_count", pa.int64()),
+    ("content_hash", pa.string()),
+])
+
+def open_location(location):
+    """Retourne (système de fichiers pyarrow, chemin de base) pour un dossier local ou une URI s3://."""
+    if location.startswith("s3://"):
+        filesystem = pafs.S3FileSystem(
+            access_key=os.getenv("AWS_ACCESS_KEY_ID"),
+            secret_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+            region=os.getenv("AWS_REGION", "eu-west-3")
+        )
+        return filesystem, location[len("s3://"):].rstrip("/")
+    path = os.path.abspath(location)
+    os.makedirs(path, exist_ok=True)
+    return pafs.LocalFileSystem(), path
+
+def read_manifest(filesystem, base_path):
+    """Entrées du manifeste {clé raw: {"source", "path", "fingerprint", "records", "min_id", "max_id"}}."""
+    selector = pafs.FileSelector(f"{base_path}/{MANIFEST_DIR}", allow_not_found=True)
+    entries = {}
+    for info in filesystem.get_file_info(selector):
+        if info.path.endswith(".json"):
+            with filesystem.open_input_stream(info.path) as f:
+                entry = json.loads(f.read())
+            entries[entry["source"]] = entry
+    return entries
+
+def write_manifest_entry(filesystem, base_path, entry):
+    filesystem.create_dir(f"{base_path}/{MANIFEST_DIR}", recursive=True)
+    with filesystem.open_output_stream(f"{base_path}/{MANIFEST_DIR}/{entry['path']}.json") as f:
+        f.write(json.dumps(entry, indent=2).encode("utf-8"))
+
+def delete_manifest_entry(filesystem, base_path, entry):
+    filesystem.delete_file(f"{base_path}/{MANIFEST_DIR}/{entry['path']}.json")
+    filesystem.delete_file(f"{base_path}/{entry['path']}")
+
+def parquet_name(source_key):
+    """imdb_raw/part-00003.jsonl.gz -> part-00003.parquet ; imdb_raw.json -> imdb_raw.parquet"""
+    return os.path.basename(source_key).split(".")[0] + ".parquet"
+
+class ParquetStagingSink:
+    """
+    Sink Parquet de la transformation Raw -> Staging, même interface que StagingLoader.
+    Chaque source raw modifiée est réécrite entièrement dans son fichier, par row groups de
+    row_group_size lignes ; son entrée de manifeste, publiée ensuite, sert aussi de point de reprise
+    (empreinte de la source raw du fichier).
+    """
+
+    def __init__(self, location, compression="zstd", row_group_size=10000, full_refresh=False, metrics=None):
+        self.location = location
+        self.compression = compression
+        self.row_group_size = row_group_size
+        self.metrics = metrics or Metrics("staging")
+        self.filesystem, self.base_path = open_location(location)
+        # En local, chaque fichier est écrit à côté puis renommé ; sur S3, l'objet n'apparaît qu'une fois complet
+        self._local = isinstance(self.filesystem, pafs.LocalFileSystem)
+        # Le manifeste est lu même en rechargement complet : retain() doit connaître les fichiers existants
+        self.full_refresh = full_refresh
+        self.manifest = read_manifest(self.filesystem, self.base_path)
+        self.files = 0
+        self.rows = 0
+        self.seconds = 0.0
+        self._writer = None
+        self._buffer = []
+        self._entry = None
+        self._path = None
+
+    def is_stale(self, source):
+        """
+        Vrai si le fichier Parquet de cette source n'existe pas, a été produit depuis une autre version de la source
+        ou si tout doit être rechargé (full_refresh).
+        """
+        if self.full_refresh:
+            return True
+        entry = self.manifest.get(source["key"])
+        return entry is None or entry["fingerprint"] != source["fingerprint"]
+
+    def begin(self, cursor):
+        pass
+
+    def begin_source(self, source):
+        name = parquet_name(source["key"])
+        self._path = f"{self.base_path}/{name}"
+        self._writer = pq.ParquetWriter(
+            self._path + ".tmp" if self._local else self._path,
+            STAGING_SCHEMA,
+            compression=self.compression,
+            filesystem=self.filesystem
+        )
+        self._entry = {"source": source["key"], "path": name, "fingerprint": source["fingerprint"], "records": 0, "min_id": None, "max_id": None}
+
+    def _write_rows(self, rows):
+        start = time.perf_counter()
+        columns = list(zip(*rows))
+        table = pa.Table.from_arrays(
+            [pa.array(column, type=field.type) for column, field in zip(columns, STAGING_SCHEMA)],
+            schema=STAGING_SCHEMA
+        )
+        self._writer.write_table(table, row_group_size=self.row_group_size)
+        ids = columns[0]
+        self._entry["records"] += len(rows)
+        self._entry["min_id"] = min(ids) if self._entry["min_id"] is None else min(self._entry["min_id"], min(ids))
+        self._entry["max_id"] = max(ids) if self._entry["max_id"] is None else max(self._entry["max_id"], max(ids))
+        self.rows += len(rows)
+        elapsed = time.perf_counter() - start
+        self.seconds += elapsed
+        self.metrics.observe("parquet_write", elapsed)
+        self.metrics.count("records", len(rows), phase="parquet_write")
+
+    def load(self, cursor, batch):
+        """Accumule les lignes et écrit un row group dès que row_group_size lignes sont disponibles."""
+        self._buffer.extend(batch)
+        while len(self._buffer) >= self.row_group_size:
+            rows, self._buffer = self._buffer[:self.row_group_size], self._buffer[self.row_group_size:]
+            self._write_rows(rows)
+
+    def end_source(self, source):
+        if self._buffer:
+            self._write_rows(self._buffer)
+            self._buffer = []
+        self._writer.close()
+        if self._local:
+            self.filesystem.move(self._path + ".tmp", self._path)
+        write_manifest_entry(self.filesystem, self.base_path, self._entry)
+        self.manifest[source["key"]] = self._entry
+        self.files += 1
+        self._writer = None
+
+    def retain(self, source_keys):
+        """Supprime les fichiers (et leur entrée de manifeste) dont la source raw n'existe plus."""
+        source_keys = set(source_keys)
+        for key in list(self.manifest):
+            if key not in source_keys:
+                delete_manifest_entry(self.filesystem, self.base_path, self.manifest.pop(key))
+
+    def finish(self, cursor):
+        print(f"Staging Parquet : {self.files} fichier(s) écrit(s) dans '{self.location}' ({len(self.manifest)} au total).")
+
+    def stats(self):
+        return {
+            "sink": "parquet",
+            "files": self.files,
+            "rows": self.rows,
+            "compression": self.compression,
+            "row_group_size": self.row_group_size,
+            "seconds": round(self.seconds, 3),
+            "rows_per_sec": round(self.rows / self.seconds, 1) if self.seconds else 0.0,
+        }
+
+def in_range(low, high, min_id, max_id):
+    """Vrai si l'intervalle d'ids [low, high] recoupe [min_id, max_id] (bornes None = non bornées)."""
+    if low is None:
+        return False
+    return (min_id is None or high >= min_id) and (max_id is None or low <= max_id)
+
+def iter_staging_parquet(location, columns, batch_size=1000, min_id=None, max_id=None):
+    """
+    Lit la couche Staging Parquet par lots de batch_size lignes, dans l'ordre des ids, en ne décodant
+    que les colonnes demandées. Chaque lot est une liste de tuples dans l'ordre de columns.
+    min_id et max_id (inclus) restreignent la lecture : les fichiers puis les row groups hors plage
+    (d'après leurs statistiques) ne sont pas lus.
+    """
+    filesystem, base_path = open_location(location)
+    entries = [entry for entry in read_manifest(filesystem, base_path).values() if in_range(entry["min_id"], entry["max_id"], min_id, max_id)]
+    read_columns = list(columns) if "id" in columns else ["id", *columns]
+    for entry in sorted(entries, key=lambda entry: entry["min_id"]):
+        with filesystem.open_input_file(f"{base_path}/{entry['path']}") as f:
+            parquet = pq.ParquetFile(f)
+            id_index = parquet.schema_arrow.get_field_index("id")
+            row_groups = [
+                i for i in range(parquet.num_row_groups)
+                if in_range(*_id_bounds(parquet.metadata.row_group(i).column(id_index).statistics), min_id, max_id)
+            ]
+            if not row_groups:
+                continue
+            for batch in parquet.iter_batches(batch_size=batch_size, row_groups=row_groups, columns=read_columns):
+                if min_id is not None:
+                    batch = batch.filter(pc.greater_equal(batch.column("id"), min_id))
+                if max_id is not None:
+                    batch = batch.filter(pc.less_equal(batch.column("id"), max_id))
+                if batch.num_rows:
+                    yield list(zip(*(batch.column(name).to_pylist() for name in columns)))
+
+def _id_bounds(statistics):
+    # Sans statistiques, le row group est lu (et filtré ligne à ligne)
+    if statistics is None or not statistics.has_min_max:
+        return -1, float("inf")
+    return statistics.min, statistics.max
@@ -1,16 +1,22 @@
 import os
+import sys
 import json
+import gzip
+import hashlib
 import re
 import string
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
 import boto3
+import ijson
 import pymysql
 from dotenv import load_dotenv
-import nltk
-from nltk.stem import WordNetLemmatizer
-
-# Télécharger les ressources NLTK nécessaires
-nltk.download('wordnet', quiet=True)
-nltk.download('omw-1.4', quiet=True)
+from parallel import in_flight_limit, iter_chunks, ordered_map
+from lemma_cache import LemmaCache, load_lemma_table, save_lemma_table
+from instrumentation import Metrics, run
+from nltk_resources import get_lemmatizer
 
 # Charger les variables d'environnement depuis .env
 load_dotenv()
@@ -20,7 +26,9 @@ AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
 AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
 AWS_REGION = os.getenv("AWS_REGION", "eu-west-3")
 S3_BUCKET = os.getenv("S3_BUCKET")
-RAW_KEY = "imdb_raw.json"  # Nom du fichier dans S3
+RAW_KEY = "imdb_raw.json"  # Nom du fichier dans S3 (ancien format, fichier unique)
+RAW_PREFIX = os.getenv("RAW_PREFIX", "imdb_raw")  # Préfixe des shards JSON Lines
+MANIFEST_KEY = f"{RAW_PREFIX}/manifest.json"
 
 # Variables MySQL
 MYSQL_HOST = os.getenv("MYSQL_HOST")
@@ -28,21 +36,141 @@ MYSQL_USER = os.getenv("MYSQL_USER")
 MYSQL_PASSWORD = os.getenv("MYSQL_PASSWORD")
 MYSQL_DB = os.getenv("MYSQL_DB")
 
-# Initialisation du lemmatizer
-lemmatizer = WordNetLemmatizer()
+# Traitement incrémental : FULL_REFRESH=1 force le retraitement de toutes les sources raw
+FULL_REFRESH = os.getenv("FULL_REFRESH", "0") == "1"
+
+# Version du traitement Raw -> Staging, incluse dans l'empreinte des sources : l'incrémenter force le
+# retraitement des sources déjà chargées (version 2 : conservation du label du dataset)
+STAGING_VERSION = 2
+
+# Partition traitée par cette exécution (DAG partitionné) : nom et clés des shards raw, séparées par des virgules
+# (vide = toutes les sources raw)
+PARTITION_NAME = os.getenv("PARTITION_NAME", "")
+RAW_SHARDS = {key.strip() for key in os.getenv("RAW_SHARDS", "").split(",") if key.strip()}
+
+# Schéma MySQL (tables, colonne content_hash, index) : SCHEMA_SETUP_ONLY=1 le crée ou le migre puis s'arrête
+# (tâche unique du DAG, avant le lancement des partitions) ; une exécution partitionnée se contente de le vérifier
+SCHEMA_SETUP_ONLY = os.getenv("SCHEMA_SETUP_ONLY", "0") == "1"
+
+# Nombre d'enregistrements insérés (et validés) par lot dans MySQL
+STAGING_BATCH_SIZE = int(os.getenv("STAGING_BATCH_SIZE", 1000))
+
+# Mode de chargement de la table imdb_reviews :
+# - "upsert" : INSERT multi-lignes ... ON DUPLICATE KEY UPDATE, validé lot par lot
+# - "load_data" : LOAD DATA LOCAL INFILE depuis un fichier temporaire (nécessite local_infile côté serveur)
+# - "swap" : rechargement complet dans une table de travail puis échange atomique (uniquement avec FULL_REFRESH=1)
+STAGING_LOAD_MODE = os.getenv("STAGING_LOAD_MODE", "upsert")
+
+# Destination(s) de la couche Staging : "mysql", "parquet" ou "mysql,parquet"
+STAGING_SINKS = {name.strip() for name in os.getenv("STAGING_SINK", "mysql").split(",") if name.strip()}
+# Parquet : dossier local ou s3://bucket/prefixe, compression et nombre de lignes par row group
+STAGING_PARQUET_PATH = os.getenv("STAGING_PARQUET_PATH", "staging_parquet")
+STAGING_PARQUET_COMPRESSION = os.getenv("STAGING_PARQUET_COMPRESSION", "zstd")
+STAGING_PARQUET_ROW_GROUP_SIZE = int(os.getenv("STAGING_PARQUET_ROW_GROUP_SIZE", 10000))
+
+# Nettoyage parallèle : nombre de processus (1 = nettoyage séquentiel) et taille des lots envoyés à chaque worker
+CLEAN_WORKERS = int(os.getenv("CLEAN_WORKERS", os.cpu_count() or 1))
+CLEAN_CHUNK_SIZE = int(os.getenv("CLEAN_CHUNK_SIZE", 500))
+
+# Moteur de nettoyage : "python" (critique par critique) ou "arrow" (lot entier vectorisé avec pyarrow.compute,
+# résultat identique)
+CLEAN_BACKEND = os.getenv("CLEAN_BACKEND", "python")
+
+# Cache de lemmatisation : taille maximale (LRU) et fichier de persistance entre deux exécutions (vide = désactivé)
+LEMMA_CACHE_SIZE = int(os.getenv("LEMMA_CACHE_SIZE", 200000))
+LEMMA_CACHE_PATH = os.getenv("LEMMA_CACHE_PATH", "")
+
+# Expressions et table de traduction compilées une seule fois
+HTML_TAG_PATTERN = re.compile(r'<.*?>')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+PUNCTUATION_TABLE = str.maketrans('', '', string.punctuation)
+
+metrics = Metrics(f"staging-{PARTITION_NAME}" if PARTITION_NAME else "staging")
+# Temps passé dans WordNet (défauts de cache uniquement)
+lemmatize_watch = metrics.stopwatch("lemmatize")
+
+def lemmatize_token(token):
+    # Le lemmatizer (et WordNet) n'est chargé qu'au premier défaut de cache
+    with lemmatize_watch:
+        return get_lemmatizer().lemmatize(token)
 
-def download_from_s3(bucket, key):
-    """Télécharge le contenu d'un objet S3 et le retourne en tant que chaîne de caractères."""
-    s3 = boto3.client(
+# Cache token -> lemme
+lemma_cache = LemmaCache(lemmatize_token, max_size=LEMMA_CACHE_SIZE)
+
+def get_s3_client():
+    """Crée un client S3 avec les clés depuis les variables d'environnement."""
+    return boto3.client(
         's3',
         aws_access_key_id=AWS_ACCESS_KEY_ID,
         aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
         region_name=AWS_REGION
     )
-    response = s3.get_object(Bucket=bucket, Key=key)
-    content = response['Body'].read().decode('utf-8')
-    print(f"Fichier '{key}' téléchargé depuis le bucket '{bucket}'.")
-    return content
+
+class PrefixedStream:
+    """Flux binaire qui restitue d'abord des octets déjà lus, puis la suite du flux sous-jacent."""
+
+    def __init__(self, prefix, stream):
+        self._prefix = prefix
+        self._stream = stream
+
+    def read(self, size=-1):
+        if not self._prefix:
+            return self._stream.read(size)
+        if size is None or size < 0:
+            data, self._prefix = self._prefix + self._stream.read(), b""
+        else:
+            data, self._prefix = self._prefix[:size], self._prefix[size:]
+        return data
+
+def fetch_manifest(s3, bucket):
+    """Retourne le manifeste des shards raw, ou None si l'ingestion a utilisé l'ancien fichier unique."""
+    try:
+        response = s3.get_object(Bucket=bucket, Key=MANIFEST_KEY)
+    except s3.exceptions.NoSuchKey:
+        return None
+    return json.loads(response['Body'].read())
+
+def iter_arrow_shard_reviews(s3, bucket, shard):
+    """
+    Lit un shard Arrow IPC (SHARD_FORMAT=arrow) : le shard est téléchargé en mémoire puis parcouru
+    record batch par record batch, sans décodage JSON. Génère des tuples (id, texte, label).
+    """
+    from raw_arrow import iter_shard_batches
+
+    with metrics.timer("download"):
+        content = s3.get_object(Bucket=bucket, Key=shard["key"])['Body'].read()
+    metrics.count("bytes", len(content), direction="download")
+    batches = iter_shard_batches(content)
+    while True:
+        with metrics.timer("parse"):
+            batch = next(batches, None)
+        if batch is None:
+            return
+        metrics.count("records", len(batch), phase="parse")
+        yield from batch
+
+def iter_shard_records(s3, bucket, shard):
+    """Lit un shard JSON Lines (éventuellement compressé en gzip) ligne par ligne."""
+    response = s3.get_object(Bucket=bucket, Key=shard["key"])
+    metrics.count("bytes", response["ContentLength"], direction="download")
+    body = response['Body']
+    stream = gzip.GzipFile(fileobj=body) if shard["key"].endswith(".gz") else body.iter_lines()
+    # Lecture (téléchargement et décompression) et décodage JSON sont chronométrés séparément
+    download, parse = metrics.stopwatch("download"), metrics.stopwatch("parse")
+    lines = iter(stream)
+    try:
+        while True:
+            with download:
+                line = next(lines, None)
+            if line is None:
+                return
+            if line.strip():
+                with parse:
+                    record = json.loads(line)
+                yield record
+    finally:
+        download.publish()
+        parse.publish()
 
 def advanced_clean_text(text):
     """
@@ -55,37 +183,129 @@ def advanced_clean_text(text):
     Retourne le texte nettoyé, le nombre de mots et le nombre de caractères.
     """
     # Supprimer les balises HTML
-    text = re.sub(r'<.*?>', '', text)
+    text = HTML_TAG_PATTERN.sub('', text)
     # Conversion en minuscules
     text = text.lower()
     # Suppression de la ponctuation
-    text = text.translate(str.maketrans('', '', string.punctuation))
+    text = text.translate(PUNCTUATION_TABLE)
     # Réduction des espaces multiples
-    text = re.sub(r'\s+', ' ', text).strip()
+    text = WHITESPACE_PATTERN.sub(' ', text).strip()
     # Tokenisation
     tokens = text.split()
     # Lemmatisation
-    lemmatized_tokens = [lemmatizer.lemmatize(token) for token in tokens]
+    lemmatized_tokens = [lemma_cache.lemmatize(token) for token in tokens]
     # Reconstitution du texte nettoyé
     cleaned_text = ' '.join(lemmatized_tokens)
     return cleaned_text, len(lemmatized_tokens), len(cleaned_text)
 
-def advanced_clean_data(text, record_id):
+def advanced_clean_data(text, record_id, label=-1):
     """
     Applique des transformations avancées sur une critique (chaîne de caractères).
     Retourne un tuple contenant :
-    - id (généré ici par l'indice)
+    - id (identifiant de la critique dans la couche Raw)
     - original_review (texte original)
     - cleaned_review (texte nettoyé et lemmatisé)
-    - label (valeur par défaut -1 puisque non fourni)
+    - label (label du dataset, -1 si la source n'en fournit pas)
     - word_count (nombre de mots)
     - char_count (nombre de caractères)
+    - content_hash (empreinte du texte original et du label)
     """
     original_review = text.strip()
     cleaned_review, word_count, char_count = advanced_clean_text(original_review)
-    # On attribue -1 comme label par défaut
-    label = -1
-    return (record_id, original_review, cleaned_review, label, word_count, char_count)
+    return (record_id, original_review, cleaned_review, label, word_count, char_count, content_hash(original_review, label))
+
+def clean_batch(chunk):
+    """Nettoie un lot de tuples (id, texte, label) avec le moteur choisi par CLEAN_BACKEND."""
+    if CLEAN_BACKEND != "arrow":
+        return [advanced_clean_data(review, record_id, label) for record_id, review, label in chunk]
+    from vectorized_cleaning import clean_texts
+
+    originals = [review.strip() for _, review, _ in chunk]
+    cleaned, word_counts, char_counts = clean_texts(originals, lemma_cache.lemmatize)
+    return [
+        (record_id, original, cleaned_review, label, word_count, char_count, content_hash(original, label))
+        for (record_id, _, label), original, cleaned_review, word_count, char_count
+        in zip(chunk, originals, cleaned, word_counts, char_counts)
+    ]
+
+def init_clean_worker(lemma_table):
+    """
+    Pré-remplit le cache de chaque processus worker avec la table de lemmes partagée par le processus
+    principal ; WordNet n'est chargé dans le worker qu'à son premier lemme inconnu.
+    """
+    global lemma_cache
+    lemma_cache = LemmaCache(lemmatize_token, max_size=LEMMA_CACHE_SIZE, table=lemma_table, track_new_entries=True)
+
+def clean_chunk(chunk):
+    """
+    Nettoie un lot de tuples (id, texte, label) ; exécuté dans un processus worker.
+    Retourne aussi les lemmes appris et les compteurs du cache pour les remonter au processus principal.
+    """
+    cleaned = clean_batch(chunk)
+    hits, misses = lemma_cache.drain_counters()
+    return cleaned, lemma_cache.drain_new_entries(), hits, misses
+
+def create_clean_executor(workers=CLEAN_WORKERS):
+    """Crée le pool de processus de nettoyage, ou None si le nettoyage doit rester séquentiel."""
+    if workers <= 1:
+        return None
+    return ProcessPoolExecutor(max_workers=workers, initializer=init_clean_worker, initargs=(lemma_cache.table(),))
+
+def clean_records(reviews, executor=None, chunk_size=CLEAN_CHUNK_SIZE):
+    """
+    Génère les enregistrements nettoyés pour un itérable de tuples (id, texte, label), dans l'ordre d'entrée.
+    Avec un executor, les lots de chunk_size critiques sont répartis entre les workers.
+    """
+    if executor is None:
+        if CLEAN_BACKEND == "arrow":
+            for chunk in iter_chunks(reviews, chunk_size):
+                with metrics.timer("clean"):
+                    cleaned_chunk = clean_batch(chunk)
+                metrics.count("records", len(cleaned_chunk), phase="clean")
+                yield from cleaned_chunk
+        else:
+            clean = metrics.stopwatch("clean")
+            try:
+                for record_id, review, label in reviews:
+                    with clean:
+                        record = advanced_clean_data(review, record_id, label)
+                    yield record
+            finally:
+                clean.publish()
+        return
+    # Deux lots en attente par worker suffisent à les occuper sans charger toute l'entrée en mémoire
+    results = ordered_map(executor, clean_chunk, iter_chunks(reviews, chunk_size), in_flight_limit(executor))
+    while True:
+        # Attente du lot suivant (inclut la lecture des lots soumis entre-temps)
+        with metrics.timer("clean"):
+            result = next(results, None)
+        if result is None:
+            return
+        cleaned_chunk, new_entries, hits, misses = result
+        lemma_cache.update(new_entries)
+        lemma_cache.add_counters(hits, misses)
+        metrics.count("records", len(cleaned_chunk), phase="clean")
+        yield from cleaned_chunk
+
+STAGING_INDEXES = {
+    # Filtres de l'API (/staging/records) ; la pagination keyset utilise la clé primaire
+    "idx_word_count": "word_count",
+    "idx_label": "label",
+}
+
+def inspect_schema(cursor):
+    """Retourne (colonne content_hash présente, index secondaires absents) pour la table imdb_reviews."""
+    cursor.execute("""
+    SELECT COUNT(*) FROM information_schema.COLUMNS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'imdb_reviews' AND COLUMN_NAME = 'content_hash'
+    """)
+    has_content_hash = cursor.fetchone()[0] > 0
+    cursor.execute("""
+    SELECT DISTINCT INDEX_NAME FROM information_schema.STATISTICS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'imdb_reviews'
+    """)
+    existing_indexes = {row[0] for row in cursor.fetchall()}
+    return has_content_hash, [name for name in STAGING_INDEXES if name not in existing_indexes]
 
 def create_table(cursor):
     """Crée la table imdb_reviews avec des colonnes pour stocker les transformations avancées."""
@@ -96,79 +316,424 @@ def create_table(cursor):
         cleaned_review LONGTEXT,
         label INT,
         word_count INT,
-        char_count INT
+        char_count INT,
+        content_hash CHAR(40),
+        INDEX idx_word_count (word_count),
+        INDEX idx_label (label)
     );
     """
     cursor.execute(create_table_query)
+    # Les tables créées avant le traitement incrémental n'ont pas la colonne content_hash, ni les index secondaires
+    has_content_hash, missing_indexes = inspect_schema(cursor)
+    if not has_content_hash:
+        cursor.execute("ALTER TABLE imdb_reviews ADD COLUMN content_hash CHAR(40)")
+    for index_name in missing_indexes:
+        cursor.execute(f"CREATE INDEX {index_name} ON imdb_reviews ({STAGING_INDEXES[index_name]})")
     print("Table 'imdb_reviews' créée ou déjà existante.")
 
-def insert_data(cursor, data):
-    """Insère plusieurs enregistrements dans la table imdb_reviews."""
-    insert_query = """
-    INSERT INTO imdb_reviews (id, original_review, cleaned_review, label, word_count, char_count)
-    VALUES (%s, %s, %s, %s, %s, %s)
+def check_schema(cursor):
+    """
+    Vérifie, sans le modifier, que le schéma est à jour : les partitions s'exécutent en parallèle et
+    ne doivent pas lancer chacune les mêmes ALTER TABLE / CREATE INDEX. Lève RuntimeError sinon.
+    """
+    has_content_hash, missing_indexes = inspect_schema(cursor)
+    cursor.execute("""
+    SELECT COUNT(*) FROM information_schema.TABLES
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+    """, ("raw_checkpoints",))
+    missing = ([] if has_content_hash else ["imdb_reviews.content_hash"]) + missing_indexes
+    if cursor.fetchone()[0] == 0:
+        missing.append("raw_checkpoints")
+    if missing:
+        raise RuntimeError(
+            f"schéma Staging incomplet ({', '.join(missing)}) : "
+            f"exécutez d'abord SCHEMA_SETUP_ONLY=1 python scripts/transform_raw_to_staging.py"
+        )
+
+def insert_data(cursor, data, table="imdb_reviews"):
+    """
+    Insère plusieurs enregistrements dans la table imdb_reviews (ou sa table de travail).
+    pymysql regroupe les lignes en INSERT multi-lignes, dans la limite de max_stmt_length.
+    """
+    insert_query = f"""
+    INSERT INTO {table} (id, original_review, cleaned_review, label, word_count, char_count, content_hash)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
     ON DUPLICATE KEY UPDATE
         original_review = VALUES(original_review),
         cleaned_review = VALUES(cleaned_review),
         label = VALUES(label),
         word_count = VALUES(word_count),
-        char_count = VALUES(char_count);
+        char_count = VALUES(char_count),
+        content_hash = VALUES(content_hash);
     """
     cursor.executemany(insert_query, data)
-    print(f"{cursor.rowcount} enregistrements insérés (ou mis à jour).")
 
-def main():
-    # Télécharger le fichier raw depuis S3
-    raw_content = download_from_s3(S3_BUCKET, RAW_KEY)
-    
-    # Charger les données JSON
-    try:
-        data = json.loads(raw_content)
-    except json.JSONDecodeError as e:
-        print("Erreur lors du décodage JSON :", e)
-        return
+def escape_tsv_field(value):
+    """Échappe une valeur pour LOAD DATA (séparateur tabulation, échappement par défaut '\\')."""
+    if value is None:
+        return "\\N"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+        .replace("\0", "\\0")
+    )
 
-    # Si le JSON contient une clé "text", on utilise cette liste
-    if isinstance(data, dict) and "text" in data:
-        reviews = data["text"]
-    else:
-        reviews = data
-
-    print("Nombre de critiques à traiter :", len(reviews))
-    
-    # Transformation avancée des données
-    transformed_data = []
-    for idx, review in enumerate(reviews):
-        # Chaque review est une chaîne, donc on passe directement à la transformation
-        transformed_data.append(advanced_clean_data(review, idx))
-    
-    print(f"Nombre d'enregistrements transformés prêts à être insérés : {len(transformed_data)}")
-    
-    # Connexion à MySQL
+def load_data_infile(cursor, data, table="imdb_reviews"):
+    """Charge un lot via LOAD DATA LOCAL INFILE ; REPLACE remplace les lignes existantes de même id."""
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", suffix=".tsv", delete=False) as f:
+        for row in data:
+            f.write("\t".join(escape_tsv_field(value) for value in row) + "\n")
+        path = f.name
     try:
-        connection = pymysql.connect(
-            host=MYSQL_HOST,
-            user=MYSQL_USER,
-            password=MYSQL_PASSWORD,
-            database=MYSQL_DB,
-            charset='utf8mb4'
+        cursor.execute(f"""
+        LOAD DATA LOCAL INFILE %s REPLACE INTO TABLE {table}
+        CHARACTER SET utf8mb4
+        FIELDS TERMINATED BY '\\t'
+        LINES TERMINATED BY '\\n'
+        (id, original_review, cleaned_review, label, word_count, char_count, content_hash)
+        """, (path,))
+    finally:
+        os.remove(path)
+
+class StagingLoader:
+    """
+    Charge les lots nettoyés dans imdb_reviews selon STAGING_LOAD_MODE, en validant chaque lot
+    séparément, et mesure le débit (lignes/s).
+    En mode "upsert", un lot en erreur est rejoué ligne par ligne pour n'écarter que les lignes fautives.
+    """
+
+    WORK_TABLE = "imdb_reviews_load"
+    OLD_TABLE = "imdb_reviews_old"
+
+    def __init__(self, connection, mode=STAGING_LOAD_MODE):
+        if mode == "swap" and (not FULL_REFRESH or RAW_SHARDS):
+            print("Le mode 'swap' n'est possible qu'avec FULL_REFRESH=1, sans partition : utilisation du mode 'upsert'.")
+            mode = "upsert"
+        self.connection = connection
+        self.mode = mode
+        self.table = self.WORK_TABLE if mode == "swap" else "imdb_reviews"
+        self.rows = 0
+        self.rejected = 0
+        self.seconds = 0.0
+
+    def begin(self, cursor):
+        """
+        En mode "swap", prépare une table de travail vide de même structure que imdb_reviews
+        (les tables laissées par une exécution interrompue sont d'abord supprimées).
+        """
+        if self.mode == "swap":
+            cursor.execute(f"DROP TABLE IF EXISTS {self.WORK_TABLE}")
+            cursor.execute(f"DROP TABLE IF EXISTS {self.OLD_TABLE}")
+            cursor.execute(f"CREATE TABLE {self.WORK_TABLE} LIKE imdb_reviews")
+            self.connection.commit()
+
+    def load(self, cursor, batch):
+        start = time.perf_counter()
+        try:
+            if self.mode == "load_data":
+                load_data_infile(cursor, batch, self.table)
+            else:
+                insert_data(cursor, batch, self.table)
+            self.connection.commit()
+            self.rows += len(batch)
+        except pymysql.MySQLError as e:
+            self.connection.rollback()
+            if self.mode != "upsert" or len(batch) == 1:
+                raise
+            print(f"Erreur sur un lot de {len(batch)} lignes ({e}), reprise ligne par ligne.")
+            self._load_rows_one_by_one(cursor, batch)
+        elapsed = time.perf_counter() - start
+        self.seconds += elapsed
+        metrics.observe("insert", elapsed)
+        metrics.count("records", len(batch), phase="insert")
+
+    def _load_rows_one_by_one(self, cursor, batch):
+        for row in batch:
+            try:
+                insert_data(cursor, [row], self.table)
+                self.connection.commit()
+                self.rows += 1
+            except pymysql.MySQLError as e:
+                self.connection.rollback()
+                self.rejected += 1
+                print(f"Enregistrement {row[0]} rejeté :", e)
+
+    def finish(self, cursor):
+        """En mode "swap", remplace atomiquement imdb_reviews par la table de travail."""
+        if self.mode != "swap":
+            return
+        # Une ancienne table laissée par une exécution interrompue entre RENAME et DROP ferait échouer le RENAME
+        cursor.execute(f"DROP TABLE IF EXISTS {self.OLD_TABLE}")
+        cursor.execute(
+            f"RENAME TABLE imdb_reviews TO {self.OLD_TABLE}, {self.WORK_TABLE} TO imdb_reviews"
         )
-    except Exception as e:
-        print("Erreur lors de la connexion à MySQL :", e)
+        cursor.execute(f"DROP TABLE IF EXISTS {self.OLD_TABLE}")
+        self.connection.commit()
+        print("Table 'imdb_reviews' remplacée par la table rechargée.")
+
+    def stats(self):
+        return {
+            "sink": "mysql",
+            "mode": self.mode,
+            "rows": self.rows,
+            "rejected": self.rejected,
+            "seconds": round(self.seconds, 3),
+            "rows_per_sec": round(self.rows / self.seconds, 1) if self.seconds else 0.0,
+        }
+
+    def is_stale(self, source, checkpoints):
+        return checkpoints.get(source["key"]) != source["fingerprint"]
+
+    def begin_source(self, source):
+        pass
+
+    def end_source(self, source):
+        pass
+
+def list_raw_sources(s3, bucket):
+    """
+    Liste les sources raw avec leur empreinte :
+    - un élément par shard (empreinte SHA-256 du manifeste) si le manifeste existe,
+    - sinon l'ancien fichier imdb_raw.json (empreinte = ETag S3).
+    L'empreinte inclut STAGING_VERSION.
+    """
+    manifest = fetch_manifest(s3, bucket)
+    if manifest is not None:
+        return [
+            {"key": shard["key"], "fingerprint": f"{shard['sha256']}:v{STAGING_VERSION}", "shard": shard}
+            for shard in manifest["shards"]
+        ]
+    head = s3.head_object(Bucket=bucket, Key=RAW_KEY)
+    etag = head["ETag"].strip('"')
+    return [{"key": RAW_KEY, "fingerprint": f"{etag}:v{STAGING_VERSION}", "shard": None}]
+
+def iter_legacy_reviews(body, open_labels=None):
+    """
+    Parse l'ancien fichier imdb_raw.json au fil du flux S3 (ijson), sans le charger en mémoire.
+    Le fichier est soit un objet {"text": [...], "label": [...]}, soit directement une liste de critiques
+    (sans label). Dans le premier cas, la colonne "label" est lue en parallèle par un second flux
+    ouvert par open_labels(). Génère des tuples (id, texte, label).
+    """
+    head = body.read(1024)
+    stream = PrefixedStream(head, body)
+    if head.lstrip()[:1] != b"{":
+        for idx, review in enumerate(ijson.items(stream, "item")):
+            yield idx, review, -1
         return
-    
+    labels = ijson.items(open_labels(), "label.item") if open_labels else iter(())
+    for idx, review in enumerate(ijson.items(stream, "text.item")):
+        yield idx, review, next(labels, -1)
+
+def iter_source_reviews(s3, bucket, source):
+    """Génère les critiques d'une source raw sous forme de tuples (id, texte, label), au fil de la lecture."""
+    if source["shard"] is not None:
+        if source["key"].endswith(".arrow"):
+            yield from iter_arrow_shard_reviews(s3, bucket, source["shard"])
+            return
+        for record in iter_shard_records(s3, bucket, source["shard"]):
+            yield record["id"], record["text"], record.get("label", -1)
+        return
+    response = s3.get_object(Bucket=bucket, Key=source["key"])
+    metrics.count("bytes", response["ContentLength"], direction="download")
+    yield from iter_legacy_reviews(response['Body'], lambda: s3.get_object(Bucket=bucket, Key=source["key"])['Body'])
+
+def content_hash(text, label=-1):
+    """Empreinte SHA-1 du texte et du label d'une critique, utilisée pour détecter les enregistrements modifiés."""
+    return hashlib.sha1(f"{label}\t{text.strip()}".encode('utf-8')).hexdigest()
+
+def create_checkpoint_table(cursor):
+    """Crée la table raw_checkpoints qui mémorise l'empreinte de chaque source raw déjà traitée."""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS raw_checkpoints (
+        source_key VARCHAR(512) PRIMARY KEY,
+        fingerprint VARCHAR(128) NOT NULL,
+        record_count INT,
+        processed_at DATETIME
+    );
+    """)
+
+def load_checkpoints(cursor):
+    """Retourne un dictionnaire {source_key: fingerprint} des sources déjà traitées."""
+    cursor.execute("SELECT source_key, fingerprint FROM raw_checkpoints")
+    return dict(cursor.fetchall())
+
+def save_checkpoint(cursor, source, record_count):
+    """Enregistre l'empreinte d'une source raw après son traitement complet."""
+    cursor.execute("""
+    INSERT INTO raw_checkpoints (source_key, fingerprint, record_count, processed_at)
+    VALUES (%s, %s, %s, UTC_TIMESTAMP())
+    ON DUPLICATE KEY UPDATE
+        fingerprint = VALUES(fingerprint),
+        record_count = VALUES(record_count),
+        processed_at = VALUES(processed_at);
+    """, (source["key"], source["fingerprint"], record_count))
+
+def fetch_existing_hashes(cursor, ids):
+    """Retourne les empreintes déjà stockées dans imdb_reviews pour la plage d'ids donnée."""
+    if not ids:
+        return {}
+    with metrics.timer("diff"):
+        cursor.execute(
+            "SELECT id, content_hash FROM imdb_reviews WHERE id BETWEEN %s AND %s",
+            (min(ids), max(ids))
+        )
+        return dict(cursor.fetchall())
+
+def iter_changed_reviews(cursor, reviews, counters, batch_size=STAGING_BATCH_SIZE, compare=True):
+    """
+    Filtre un flux de critiques (id, texte, label) pour ne garder que les nouvelles ou modifiées,
+    en comparant les empreintes par lots de batch_size ids (compare=False : tout est conservé).
+    """
+    for batch in iter_chunks(reviews, batch_size):
+        counters["read"] += len(batch)
+        existing_hashes = {} if FULL_REFRESH or not compare else fetch_existing_hashes(cursor, [record[0] for record in batch])
+        for record_id, review, label in batch:
+            if existing_hashes.get(record_id) != content_hash(review, label):
+                yield record_id, review, label
+
+def process_source(s3, sinks, cursor, source, executor=None, compare=True):
+    """
+    Traite une source raw modifiée en flux : lecture S3 -> filtrage des critiques inchangées
+    -> nettoyage -> chargement par lots de STAGING_BATCH_SIZE dans les sinks où la source est obsolète, au fil de l'eau.
+    Le filtrage est désactivé (compare=False) quand un sink doit réécrire la source entière (Parquet).
+    La mémoire utilisée est bornée par la taille des lots. Retourne (nombre lu, nombre écrit).
+    """
+    counters = {"read": 0, "written": 0}
+    reviews = iter_source_reviews(s3, S3_BUCKET, source)
+    cleaned = clean_records(iter_changed_reviews(cursor, reviews, counters, compare=compare), executor)
+    for sink in sinks:
+        sink.begin_source(source)
+    for batch in iter_chunks(cleaned, STAGING_BATCH_SIZE):
+        for sink in sinks:
+            sink.load(cursor, batch)
+        counters["written"] += len(batch)
+    for sink in sinks:
+        sink.end_source(source)
+    return counters["read"], counters["written"]
+
+def main():
+    s3 = get_s3_client()
+    lemma_cache.update(load_lemma_table(LEMMA_CACHE_PATH))
+
+    # Connexion à MySQL, uniquement si la table imdb_reviews fait partie des destinations
+    # (un sink Parquet seul garde ses points de reprise dans son manifeste)
+    connection = None
+    if "mysql" in STAGING_SINKS:
+        try:
+            connection = pymysql.connect(
+                host=MYSQL_HOST,
+                user=MYSQL_USER,
+                password=MYSQL_PASSWORD,
+                database=MYSQL_DB,
+                charset='utf8mb4',
+                local_infile=STAGING_LOAD_MODE == "load_data"
+            )
+        except Exception as e:
+            print("Erreur lors de la connexion à MySQL :", e)
+            return 1
+
+    executor = None
     try:
-        with connection.cursor() as cursor:
-            # Créer la table si nécessaire
-            create_table(cursor)
-            # Insérer les données transformées
-            insert_data(cursor, transformed_data)
-        connection.commit()
-        print("Données insérées avec succès dans MySQL.")
+        with connection.cursor() if connection else nullcontext() as cursor:
+            # Créer ou migrer les tables si nécessaire (une seule fois avant les partitions, qui ne font que vérifier)
+            if connection and PARTITION_NAME and not SCHEMA_SETUP_ONLY:
+                check_schema(cursor)
+            elif connection:
+                create_table(cursor)
+                create_checkpoint_table(cursor)
+                connection.commit()
+            if SCHEMA_SETUP_ONLY:
+                print("Schéma de la couche Staging à jour.")
+                return
+            executor = create_clean_executor()
+
+            # Sinks de la couche Staging : table MySQL (points de reprise dans raw_checkpoints)
+            # et/ou fichiers Parquet (points de reprise dans leur manifeste)
+            loader = StagingLoader(connection) if connection else None
+            parquet_sink = None
+            if "parquet" in STAGING_SINKS:
+                from staging_parquet import ParquetStagingSink
+                parquet_sink = ParquetStagingSink(
+                    STAGING_PARQUET_PATH, STAGING_PARQUET_COMPRESSION, STAGING_PARQUET_ROW_GROUP_SIZE,
+                    full_refresh=FULL_REFRESH, metrics=metrics
+                )
+            sinks = [sink for sink in (loader, parquet_sink) if sink is not None]
+
+            # Ne garder que les sources de la partition dont l'empreinte a changé depuis le dernier traitement
+            sources = list_raw_sources(s3, S3_BUCKET)
+            checkpoints = {} if FULL_REFRESH or not loader else load_checkpoints(cursor)
+            # Sinks à alimenter pour chaque source : un sink à jour pour une source n'en reçoit rien
+            stale_sinks = {}
+            for source in sources:
+                if RAW_SHARDS and source["key"] not in RAW_SHARDS:
+                    continue
+                source_sinks = [
+                    sink for sink in sinks
+                    if (sink.is_stale(source, checkpoints) if sink is loader else sink.is_stale(source))
+                ]
+                if source_sinks:
+                    stale_sinks[source["key"]] = source_sinks
+            changed_sources = [source for source in sources if source["key"] in stale_sinks]
+            partition_size = len(RAW_SHARDS) if RAW_SHARDS else len(sources)
+            print(f"{len(changed_sources)} source(s) raw nouvelle(s) ou modifiée(s) sur {partition_size}.")
+            if not changed_sources:
+                print("Aucune modification dans la couche Raw, rien à traiter.")
+                return
+
+            for sink in sinks:
+                sink.begin(cursor)
+            total_read, total_written = 0, 0
+            processed = []
+            for source in changed_sources:
+                source_sinks = stale_sinks[source["key"]]
+                # Un fichier Parquet est réécrit entièrement : toutes les critiques de la source sont alors conservées
+                compare = parquet_sink not in source_sinks
+                read_count, written_count = process_source(s3, source_sinks, cursor, source, executor, compare)
+                if loader in source_sinks:
+                    processed.append((source, read_count))
+                # Le checkpoint n'est validé qu'une fois la source entièrement traitée
+                # (et, en mode "swap", une fois la table de travail échangée)
+                if loader in source_sinks and loader.mode != "swap":
+                    save_checkpoint(cursor, source, read_count)
+                    connection.commit()
+                total_read += read_count
+                total_written += written_count
+                print(f"Source '{source['key']}' : {written_count} critiques transformées sur {read_count}.")
+            if parquet_sink:
+                parquet_sink.retain(source["key"] for source in sources)
+            for sink in sinks:
+                sink.finish(cursor)
+            if loader and loader.mode == "swap":
+                for source, read_count in processed:
+                    save_checkpoint(cursor, source, read_count)
+                connection.commit()
+
+        print(f"Couche Staging alimentée : {total_written} enregistrements écrits sur {total_read} lus.")
+        for sink in sinks:
+            print("Chargement :", sink.stats())
+        lemma_stats = lemma_cache.stats()
+        print("Cache de lemmatisation :", lemma_stats)
+        metrics.count("lemma_cache_hits", lemma_stats["hits"])
+        metrics.count("lemma_cache_misses", lemma_stats["misses"])
+        lemmatize_watch.publish()
+        save_lemma_table(LEMMA_CACHE_PATH, lemma_cache.table())
+    except (json.JSONDecodeError, ijson.JSONError) as e:
+        print("Erreur lors du décodage JSON :", e)
+        return 1
     except Exception as e:
         print("Erreur lors de l'insertion des données :", e)
+        return 1
     finally:
-        connection.close()
+        if executor is not None:
+            executor.shutdown()
+        if connection is not None:
+            connection.close()
 
 if __name__ == "__main__":
-    main()
+    # Code de sortie non nul en cas d'erreur : la tâche Airflow échoue et peut être relancée
+    with run(metrics):
+        status = main()
+    sys.exit(status)
@@ -1,12 +1,16 @@
 import os
+import sys
+from collections import deque
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import pymysql
-from pymongo import MongoClient
+from pymongo import MongoClient, ReplaceOne
 from dotenv import load_dotenv
-import nltk
-from nltk.sentiment import SentimentIntensityAnalyzer
-
-# Télécharger le lexique VADER (seulement la première fois)
-nltk.download('vader_lexicon', quiet=True)
+from parallel import in_flight_limit, iter_chunks, ordered_map
+from sentiment_cache import SentimentCache, analyzer_version, text_hash
+from analytics import CuratedSummary
+from instrumentation import Metrics, run
+from nltk_resources import get_sentiment_analyzer, nltk_version
 
 # Charger les variables d'environnement depuis .env
 load_dotenv()
@@ -17,61 +21,95 @@ MYSQL_USER = os.getenv("MYSQL_USER")
 MYSQL_PASSWORD = os.getenv("MYSQL_PASSWORD")
 MYSQL_DB = os.getenv("MYSQL_DB")
 
+# Lecture MySQL paginée par id (keyset) : nombre de lignes lues par requête
+MYSQL_READ_BATCH_SIZE = int(os.getenv("MYSQL_READ_BATCH_SIZE", 1000))
+
+# Source de la couche Staging : "mysql" (table imdb_reviews) ou "parquet" (fichiers écrits avec STAGING_SINK=parquet)
+STAGING_SOURCE = os.getenv("STAGING_SOURCE", "mysql")
+STAGING_PARQUET_PATH = os.getenv("STAGING_PARQUET_PATH", "staging_parquet")
+# Colonnes lues en Parquet : celles des documents curated (content_hash n'est pas décodé)
+STAGING_COLUMNS = ("id", "original_review", "cleaned_review", "label", "word_count", "char_count")
+
 # Variables MongoDB
 MONGO_URI = os.getenv("MONGO_URI")  
 MONGO_DB = os.getenv("MONGO_DB")    
 
-# Initialisation de l'analyseur de sentiment VADER
-sia = SentimentIntensityAnalyzer()
+# Écritures MongoDB : taille des lots bulk_write et nombre de lots envoyés en parallèle
+MONGO_BATCH_SIZE = int(os.getenv("MONGO_BATCH_SIZE", 1000))
+MONGO_WRITE_WORKERS = int(os.getenv("MONGO_WRITE_WORKERS", 1))
 
-def fetch_data_from_mysql():
-    """Récupère tous les enregistrements de la table imdb_reviews dans MySQL."""
-    try:
-        connection = pymysql.connect(
-            host=MYSQL_HOST,
-            user=MYSQL_USER,
-            password=MYSQL_PASSWORD,
-            database=MYSQL_DB,
-            charset='utf8mb4'
-        )
-    except Exception as e:
-        print("Erreur lors de la connexion à MySQL :", e)
-        return []
+# Enrichissement parallèle : nombre de processus (1 = séquentiel) et taille des lots confiés à chaque worker
+ENRICH_WORKERS = int(os.getenv("ENRICH_WORKERS", os.cpu_count() or 1))
+ENRICH_CHUNK_SIZE = int(os.getenv("ENRICH_CHUNK_SIZE", 500))
 
-    data = []
-    try:
-        with connection.cursor() as cursor:
-            query = "SELECT id, original_review, cleaned_review, label, word_count, char_count FROM imdb_reviews"
-            cursor.execute(query)
-            data = cursor.fetchall()
-            print(f"{len(data)} enregistrements récupérés depuis MySQL.")
-    except Exception as e:
-        print("Erreur lors de la récupération des données :", e)
-    finally:
-        connection.close()
-    return data
+# Cache des scores de sentiment dans la base de staging (SENTIMENT_CACHE=0 pour le désactiver)
+SENTIMENT_CACHE = os.getenv("SENTIMENT_CACHE", "1") == "1"
 
-def enrich_data(record):
+# Partition traitée par cette exécution (DAG partitionné) : nom et bornes d'ids incluses (vides = pas de borne)
+PARTITION_NAME = os.getenv("PARTITION_NAME", "")
+PARTITION_MIN_ID = int(os.environ["PARTITION_MIN_ID"]) if os.getenv("PARTITION_MIN_ID") else None
+PARTITION_MAX_ID = int(os.environ["PARTITION_MAX_ID"]) if os.getenv("PARTITION_MAX_ID") else None
+
+# Agrégats matérialisés : identifiant de la partition traitée par cette exécution
+SUMMARY_PARTITION = os.getenv("SUMMARY_PARTITION", PARTITION_NAME or "all")
+
+# Index MongoDB et table sentiment_cache : SCHEMA_SETUP_ONLY=1 les crée puis s'arrête (tâche unique du DAG,
+# avant le lancement des partitions) ; une exécution partitionnée se contente de les vérifier
+SCHEMA_SETUP_ONLY = os.getenv("SCHEMA_SETUP_ONLY", "0") == "1"
+
+metrics = Metrics(f"curated-{PARTITION_NAME}" if PARTITION_NAME else "curated")
+
+def iter_data_from_mysql(connection, batch_size=MYSQL_READ_BATCH_SIZE, min_id=None, max_id=None):
     """
-    Pour un enregistrement donné, calcule l'analyse de sentiment sur le texte nettoyé.
-    Retourne un dictionnaire avec toutes les informations enrichies.
+    Parcourt la table imdb_reviews par pages de batch_size lignes, triées par id (pagination keyset :
+    chaque page reprend après le dernier id lu, via la clé primaire). Seule une page est en mémoire.
+    min_id et max_id (inclus) restreignent la lecture à la plage d'ids d'une partition.
     """
+    query = f"""
+    SELECT id, original_review, cleaned_review, label, word_count, char_count
+    FROM imdb_reviews
+    WHERE id > %s{" AND id <= %s" if max_id is not None else ""}
+    ORDER BY id
+    LIMIT %s
+    """
+    last_id = -1 if min_id is None else min_id - 1
+    while True:
+        params = (last_id, max_id, batch_size) if max_id is not None else (last_id, batch_size)
+        with metrics.timer("read"), connection.cursor() as cursor:
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+        if not rows:
+            return
+        metrics.count("records", len(rows), phase="read")
+        yield rows
+        last_id = rows[-1][0]
+
+def iter_data_from_parquet(location=STAGING_PARQUET_PATH, batch_size=MYSQL_READ_BATCH_SIZE, min_id=None, max_id=None):
+    """Parcourt la couche Staging Parquet par lots, en ne lisant que les colonnes STAGING_COLUMNS (et la plage d'ids demandée)."""
+    from staging_parquet import iter_staging_parquet
+
+    batches = iter_staging_parquet(location, STAGING_COLUMNS, batch_size, min_id, max_id)
+    while True:
+        with metrics.timer("read"):
+            rows = next(batches, None)
+        if rows is None:
+            return
+        metrics.count("records", len(rows), phase="read")
+        yield rows
+
+def categorize_sentiment(compound_score):
+    """Catégorise le score compound VADER en positive / negative / neutral."""
+    if compound_score >= 0.05:
+        return "positive"
+    if compound_score <= -0.05:
+        return "negative"
+    return "neutral"
+
+def build_document(record, compound_score):
+    """Construit le document enrichi à partir d'un enregistrement MySQL et de son score de sentiment."""
     # record est une tuple : (id, original_review, cleaned_review, label, word_count, char_count)
     (record_id, original_review, cleaned_review, label, word_count, char_count) = record
-    
-    # Calculer le score de sentiment en utilisant le champ cleaned_review
-    sentiment_scores = sia.polarity_scores(cleaned_review)
-    compound_score = sentiment_scores.get('compound')
-    
-    # Catégoriser le sentiment 
-    if compound_score >= 0.05:
-        sentiment = "positive"
-    elif compound_score <= -0.05:
-        sentiment = "negative"
-    else:
-        sentiment = "neutral"
-    
-    enriched_record = {
+    return {
         "id": record_id,
         "original_review": original_review,
         "cleaned_review": cleaned_review,
@@ -79,41 +117,227 @@ def enrich_data(record):
         "word_count": word_count,
         "char_count": char_count,
         "sentiment_score": compound_score,
-        "sentiment": sentiment
+        "sentiment": categorize_sentiment(compound_score)
     }
-    return enriched_record
 
-def insert_into_mongodb(documents):
-    """Insère une liste de documents dans la collection imdb_reviews de MongoDB."""
+def score_texts(texts):
+    """Calcule le score compound VADER de chaque texte ; exécuté dans un worker en mode parallèle."""
+    sia = get_sentiment_analyzer()
+    return [sia.polarity_scores(text).get('compound') for text in texts]
+
+def enrich_data(record):
+    """
+    Pour un enregistrement donné, calcule l'analyse de sentiment sur le texte nettoyé.
+    Retourne un dictionnaire avec toutes les informations enrichies.
+    """
+    return build_document(record, score_texts([record[2]])[0])
+
+def create_enrich_executor(workers=ENRICH_WORKERS):
+    """Crée le pool de processus d'enrichissement, ou None si l'enrichissement doit rester séquentiel."""
+    if workers <= 1:
+        return None
+    # Chaque worker crée son analyseur VADER au premier lot qu'il reçoit
+    return ProcessPoolExecutor(max_workers=workers)
+
+def enrich_records(records, executor=None, chunk_size=ENRICH_CHUNK_SIZE, cache=None):
+    """
+    Génère les documents enrichis pour un flux d'enregistrements MySQL, dans l'ordre d'entrée.
+    Avec un cache, seuls les textes nettoyés absents du cache (nouveaux ou modifiés) sont scorés.
+    Avec un executor, seuls ces textes sont envoyés aux workers (et seuls les scores reviennent) ;
+    au plus deux lots par worker sont en cours, ce qui enchaîne lecture MySQL, scoring et écriture MongoDB.
+    """
+    # Les lots soumis sont conservés dans l'ordre pour y rattacher les scores renvoyés
+    submitted = deque()
+
+    def texts_to_score(chunks):
+        for chunk in chunks:
+            hashes = [text_hash(record[2]) for record in chunk]
+            known = {}
+            if cache:
+                with metrics.timer("sentiment_cache"):
+                    known = {hash_: score for hash_, (score, _) in cache.lookup(hashes).items()}
+            missing = {}
+            for hash_, record in zip(hashes, chunk):
+                if hash_ not in known and hash_ not in missing:
+                    missing[hash_] = record[2]
+            submitted.append((chunk, hashes, known, list(missing)))
+            yield list(missing.values())
+
+    pending = texts_to_score(iter_chunks(records, chunk_size))
+    if executor is None:
+        scored = map(score_texts, pending)
+    else:
+        scored = ordered_map(executor, score_texts, pending, in_flight_limit(executor))
+
+    while True:
+        # Scoring du lot suivant (ou attente de son résultat), lecture MySQL des lots suivants comprise
+        with metrics.timer("enrich"):
+            scores = next(scored, None)
+        if scores is None:
+            return
+        chunk, hashes, known, missing_hashes = submitted.popleft()
+        known.update(zip(missing_hashes, scores))
+        metrics.count("records", len(chunk), phase="enrich")
+        metrics.count("sentiment_scored", len(scores))
+        if cache:
+            with metrics.timer("sentiment_cache"):
+                cache.store([(hash_, score, categorize_sentiment(score)) for hash_, score in zip(missing_hashes, scores)])
+        for hash_, record in zip(hashes, chunk):
+            yield build_document(record, known[hash_])
+
+def write_batch(collection, documents):
+    """
+    Écrit un lot de documents en upsert non ordonné, avec _id = id de la critique :
+    une réexécution remplace les documents existants au lieu de les dupliquer.
+    Retourne le nombre de documents créés ou modifiés.
+    """
+    operations = [ReplaceOne({"_id": doc["id"]}, {"_id": doc["id"], **doc}, upsert=True) for doc in documents]
+    with metrics.timer("write"):
+        result = collection.bulk_write(operations, ordered=False)
+    metrics.count("records", len(documents), phase="write")
+    return result.upserted_count + result.modified_count
+
+def create_indexes(collection):
+    """
+    Crée les index secondaires utilisés par les filtres de l'API (/curated/records) ;
+    l'index composé (sentiment, _id) sert à la fois le filtre d'égalité et la pagination par _id.
+    """
+    collection.create_index([("sentiment", 1), ("_id", 1)], name="sentiment_id")
+    collection.create_index([("sentiment_score", 1)], name="sentiment_score")
+    collection.create_index([("word_count", 1)], name="word_count")
+
+def check_indexes(collection):
+    """Vérifie, sans les créer, que les index de create_indexes existent ; lève RuntimeError sinon."""
+    missing = {"sentiment_id", "sentiment_score", "word_count"} - set(collection.index_information())
+    if missing:
+        raise RuntimeError(
+            f"index MongoDB absents ({', '.join(sorted(missing))}) : "
+            f"exécutez d'abord SCHEMA_SETUP_ONLY=1 python scripts/transform_staging_to_curated.py"
+        )
+
+def remove_legacy_duplicates(collection):
+    """Supprime les documents des anciennes exécutions, insérés avec un ObjectId généré au lieu de l'id."""
+    result = collection.delete_many({"_id": {"$type": "objectId"}})
+    if result.deleted_count:
+        print(f"{result.deleted_count} doublons hérités des anciennes insertions supprimés de MongoDB.")
+
+def save_summary(db, partition, summary):
+    """
+    Enregistre les agrégats de la partition traitée dans imdb_reviews_summary, puis recalcule la vue
+    globale en fusionnant les agrégats de toutes les partitions (une lecture par partition, pas de
+    parcours de la collection imdb_reviews). L'API lit ensuite uniquement le document "global".
+    Une exécution non partitionnée ("all") couvre toutes les critiques : ses agrégats remplacent ceux
+    des partitions, et inversement, pour qu'aucune critique ne soit comptée deux fois.
+    """
+    summaries = db["imdb_reviews_summary"]
+    if partition == "all":
+        summaries.delete_many({"type": "partition", "partition": {"$ne": "all"}})
+    else:
+        summaries.delete_one({"_id": "partition:all"})
+    summaries.replace_one(
+        {"_id": f"partition:{partition}"},
+        {"type": "partition", "partition": partition, "updated_at": datetime.now(timezone.utc), **summary.to_dict()},
+        upsert=True
+    )
+    partitions = rebuild_global_summary(summaries)
+    print(f"Agrégats de la partition '{partition}' enregistrés ({partitions} partition(s) fusionnée(s)).")
+
+def rebuild_global_summary(summaries):
+    """Recalcule le document "global" à partir des documents de partition ; retourne le nombre de partitions fusionnées."""
+    merged, partitions = CuratedSummary.merge_all(summaries.find({"type": "partition"}))
+    summaries.replace_one(
+        {"_id": "global"},
+        {"type": "global", "partitions": partitions, "updated_at": datetime.now(timezone.utc), **merged.analytics()},
+        upsert=True
+    )
+    return partitions
+
+def insert_into_mongodb(collection, documents):
+    """
+    Écrit un flux de documents dans la collection imdb_reviews de MongoDB par lots
+    de MONGO_BATCH_SIZE upserts, éventuellement envoyés en parallèle (MONGO_WRITE_WORKERS).
+    Retourne (nombre de documents écrits, nombre de documents créés ou modifiés).
+    """
+    total, written = 0, 0
+    batches = iter_chunks(documents, MONGO_BATCH_SIZE)
+    if MONGO_WRITE_WORKERS > 1:
+        with ThreadPoolExecutor(max_workers=MONGO_WRITE_WORKERS) as executor:
+            for batch, batch_written in ordered_map(executor, lambda batch: (batch, write_batch(collection, batch)), batches, MONGO_WRITE_WORKERS * 2):
+                total += len(batch)
+                written += batch_written
+    else:
+        for batch in batches:
+            total += len(batch)
+            written += write_batch(collection, batch)
+    return total, written
+
+def main():
+    # Connexion à MySQL
+    try:
+        connection = pymysql.connect(
+            host=MYSQL_HOST,
+            user=MYSQL_USER,
+            password=MYSQL_PASSWORD,
+            database=MYSQL_DB,
+            charset='utf8mb4'
+        )
+    except Exception as e:
+        print("Erreur lors de la connexion à MySQL :", e)
+        return 1
+
+    client = None
+    executor = None
     try:
         client = MongoClient(MONGO_URI)
-        db = client[MONGO_DB]
-        collection = db["imdb_reviews"]
-        # Insertion en masse
-        result = collection.insert_many(documents)
-        print(f"{len(result.inserted_ids)} documents insérés dans MongoDB.")
+        collection = client[MONGO_DB]["imdb_reviews"]
+        cache = None
+        if SENTIMENT_CACHE:
+            cache = SentimentCache(connection, analyzer_version(get_sentiment_analyzer(), nltk_version()))
+        # Mise en place une seule fois avant les partitions, qui s'exécutent en parallèle et ne font que vérifier
+        if PARTITION_NAME and not SCHEMA_SETUP_ONLY:
+            check_indexes(collection)
+            if cache:
+                cache.check_table()
+        else:
+            remove_legacy_duplicates(collection)
+            create_indexes(collection)
+            if cache:
+                cache.create_table()
+        if SCHEMA_SETUP_ONLY:
+            print("Index MongoDB et cache de sentiment à jour.")
+            return
+        executor = create_enrich_executor()
+
+        # Lecture paginée (MySQL ou Parquet) -> enrichissement (parallèle) -> écriture dans MongoDB, lot par lot
+        if STAGING_SOURCE == "parquet":
+            pages = iter_data_from_parquet(min_id=PARTITION_MIN_ID, max_id=PARTITION_MAX_ID)
+        else:
+            pages = iter_data_from_mysql(connection, min_id=PARTITION_MIN_ID, max_id=PARTITION_MAX_ID)
+        records = (record for rows in pages for record in rows)
+        summary = CuratedSummary()
+        documents = summary.track(enrich_records(records, executor, cache=cache))
+        total, written = insert_into_mongodb(collection, documents)
+        if total == 0:
+            print(f"Aucune donnée récupérée depuis la couche Staging ({STAGING_SOURCE}).")
+        else:
+            print(f"{total} documents enrichis écrits dans MongoDB ({written} créés ou modifiés).")
+        # Les agrégats sont enregistrés même pour une partition vide, pour ne pas garder ceux d'une exécution précédente
+        with metrics.timer("summary"):
+            save_summary(client[MONGO_DB], SUMMARY_PARTITION, summary)
+        if cache:
+            print("Cache de sentiment :", cache.stats())
     except Exception as e:
-        print("Erreur lors de l'insertion dans MongoDB :", e)
+        print("Erreur lors du traitement Staging -> Curated :", e)
+        return 1
     finally:
-        client.close()
-
-def main():
-    # Étape 1 : Récupérer les données depuis MySQL
-    mysql_data = fetch_data_from_mysql()
-    if not mysql_data:
-        print("Aucune donnée récupérée depuis MySQL. Arrêt du script.")
-        return
-    
-    # Étape 2 : Enrichir les données avec l'analyse de sentiment
-    enriched_documents = []
-    for record in mysql_data:
-        enriched_doc = enrich_data(record)
-        enriched_documents.append(enriched_doc)
-    
-    print(f"Nombre d'enregistrements enrichis prêts à être insérés dans MongoDB : {len(enriched_documents)}")
-    
-    # Étape 3 : Insérer les documents enrichis dans MongoDB
-    insert_into_mongodb(enriched_documents)
+        if executor is not None:
+            executor.shutdown()
+        if client is not None:
+            client.close()
+        connection.close()
 
 if __name__ == "__main__":
-    main()
+    # Code de sortie non nul en cas d'erreur : la tâche Airflow échoue et peut être relancée
+    with run(metrics):
+        status = main()
+    sys.exit(status)
@@ -0,0 +1,54 @@
+import re
+import string
+import sys
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Caractères considérés comme des espaces par str.split(), str.strip() et \s en Python :
+# RE2 (utilisé par Arrow) ne reconnaît que les espaces ASCII avec \s, on explicite donc la liste complète.
+WHITESPACE_CHARS = "".join(chr(code) for code in range(sys.maxunicode + 1) if chr(code).isspace())
+WHITESPACE_CLASS = "[" + "".join(f"\\x{{{ord(char):x}}}" for char in WHITESPACE_CHARS) + "]+"
+PUNCTUATION_CLASS = "[" + re.escape(string.punctuation) + "]"
+HTML_TAG_PATTERN = "<.*?>"
+
+def clean_texts(texts, lemmatize):
+    """
+    Version vectorisée (Arrow) de advanced_clean_text sur une liste de textes déjà débarrassés des
+    espaces de début et de fin. Produit exactement les mêmes résultats que la version Python :
+    retourne trois listes (textes nettoyés, nombres de mots, nombres de caractères).
+    Les lemmes ne sont calculés qu'une fois par token distinct du lot.
+    """
+    if not texts:
+        return [], [], []
+    array = pa.array(texts, type=pa.string())
+    # Supprimer les balises HTML
+    array = pc.replace_substring_regex(array, HTML_TAG_PATTERN, "")
+    # Conversion en minuscules : les règles Unicode d'Arrow et de Python divergent sur quelques caractères
+    # (sigma final, I pointé...), seuls les textes ASCII sont donc convertis par Arrow
+    non_ascii = pc.invert(pc.string_is_ascii(array))
+    lowered = pc.ascii_lower(array)
+    if pc.any(non_ascii).as_py():
+        replacements = pa.array([text.lower() for text in pc.filter(array, non_ascii).to_pylist()], type=pa.string())
+        lowered = pc.replace_with_mask(lowered, non_ascii, replacements)
+    array = lowered
+    # Suppression de la ponctuation
+    array = pc.replace_substring_regex(array, PUNCTUATION_CLASS, "")
+    # Réduction des espaces multiples
+    array = pc.replace_substring_regex(array, WHITESPACE_CLASS, " ")
+    array = pc.utf8_trim(array, " ")
+
+    # Tokenisation et lemmatisation sur le vocabulaire distinct du lot
+    tokens = pc.split_pattern(array, " ")
+    flat_tokens = pc.list_flatten(tokens)
+    vocabulary = pc.unique(flat_tokens)
+    lemmas = pa.array(
+        [lemmatize(token) if token else "" for token in vocabulary.to_pylist()],
+        type=pa.string()
+    )
+    lemmatized = pc.take(lemmas, pc.index_in(flat_tokens, value_set=vocabulary))
+    cleaned = pc.binary_join(pa.ListArray.from_arrays(tokens.offsets, lemmatized), " ")
+
+    # Un texte vide donne [''] avec split_pattern mais [] avec str.split()
+    word_counts = pc.if_else(pc.equal(array, ""), 0, pc.list_value_length(tokens))
+    char_counts = pc.utf8_length(cleaned)
+    return cleaned.to_pylist(), word_counts.to_pylist(), char_counts.to_pylist()